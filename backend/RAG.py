@@ -1,37 +1,429 @@
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.ollama import Ollama
-from llama_index.core import Settings
+import os
+import threading
+import time
 
-from llama_index.core.postprocessor import MetadataReplacementPostProcessor
-from llama_index.core import StorageContext, load_index_from_storage
+import orjson
 
-Settings.llm = Ollama(
-    model="llama3",
-    request_timeout=30000.0,
-    temperature=0
+import config
+from answer_cache import AnswerCache
+from llm_gateway import get_gateway
+from metrics import QUERIES, QUERY_STAGE_SECONDS, StageTimings, log_event
+from table_store import get_table_store
+
+# llama-index, the embedding model and the index are loaded by `initialize()`, not on import,
+# so the server accepts connections (and answers /healthz) while they load in the background.
+
+PERSIST_DIR = "Manual"
+
+# Paragraphs ingested since the last full persist, replayed on top of the persisted index at startup
+INGEST_LOG_PATH = os.path.join(PERSIST_DIR, "ingest_log.jsonl")
+
+# Serializes index mutations against retrieval
+index_lock = threading.Lock()
+
+# Exact + semantic answer cache; invalidated whenever the index changes
+answer_cache = AnswerCache(
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl=config.ANSWER_CACHE_TTL,
+    similarity_threshold=config.ANSWER_CACHE_SIMILARITY,
 )
-Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en")
-
-
-storage_context = StorageContext.from_defaults(persist_dir="Manual")
-
-sentence_index = load_index_from_storage(storage_context)
-
-
-query_engine = sentence_index.as_query_engine(
-    similarity_top_k=3,
-    
-    context_prompt=(
-        "You are a chatbot who should answer the user's query without adding anything from your prior knowledge and to the point "
-        "Answer  only from the given context and DO NOT USE YOUR PRIOR KNOWLEDGE IN ANY CASE! Don't say anything that is not in the context."
-        "If the answer is found directly in the context, try to answer as it is without changing the wordings much" 
-        "IF the answer isn't from context, just say YOU DON'T KNOW THE ANSWER and DONOT TRY TO add Additional Info!"
-        "If you are unsure of the answer, just say YOU DON'T KNOW THE ANSWER and DONOT TRY TO add Additional Info!"
-        "If the user says 'don't help or I don't need help', just say okay and DONOT TRY TO add Additional Info!"
-        "If the user greets you you must greet him nicely"
-        ),
-    # the target key defaults to `window` to match the node_parser's default
-    node_postprocessors=[
-        MetadataReplacementPostProcessor(target_metadata_key="window")
-    ],
-)
\ No newline at end of file
+
+CONTEXT_PROMPT = (
+    "You are a chatbot who should answer the user's query without adding anything from your prior knowledge and to the point "
+    "Answer  only from the given context and DO NOT USE YOUR PRIOR KNOWLEDGE IN ANY CASE! Don't say anything that is not in the context."
+    "If the answer is found directly in the context, try to answer as it is without changing the wordings much" 
+    "IF the answer isn't from context, just say YOU DON'T KNOW THE ANSWER and DONOT TRY TO add Additional Info!"
+    "If you are unsure of the answer, just say YOU DON'T KNOW THE ANSWER and DONOT TRY TO add Additional Info!"
+    "If the user says 'don't help or I don't need help', just say okay and DONOT TRY TO add Additional Info!"
+    "If the user greets you you must greet him nicely"
+)
+
+# Set by `initialize()`; `query_engine` is assigned last, so it doubles as the ready flag
+node_parser = None
+sentence_index = None
+node_postprocessors = []
+query_engine = None
+streaming_query_engine = None
+
+_init_lock = threading.Lock()
+_init_error = None
+_ingest_log_records = 0
+
+
+def initialize():
+    """
+    Loads the LLM client, the embedding model and the index, replays the ingest log and
+    warms the embedder. Safe to call from any thread: concurrent callers wait for the
+    first one, and later calls return immediately.
+    """
+    global node_parser, sentence_index, node_postprocessors, query_engine, streaming_query_engine
+    global _init_error, _ingest_log_records
+
+    if query_engine is not None:
+        return
+
+    with _init_lock:
+        if query_engine is not None:
+            return
+
+        started = time.perf_counter()
+        try:
+            from llama_index.core import Settings, StorageContext, VectorStoreIndex, load_index_from_storage
+            from llama_index.core.node_parser import SentenceWindowNodeParser
+            from llama_index.core.postprocessor import MetadataReplacementPostProcessor
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+            from numpy_vector_store import NumpyVectorStore
+
+            # Answers go through the shared LLM gateway, with the query call class's timeout
+            Settings.llm = get_gateway().llama_index_llm("query")
+            Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en")
+
+            # Same sentence-window chunking the index was built with; MetadataReplacementPostProcessor reads "window"
+            node_parser = SentenceWindowNodeParser.from_defaults(
+                window_size=3,
+                window_metadata_key="window",
+                original_text_metadata_key="original_text",
+            )
+
+            # Memory-mapped embeddings once the index has been migrated (see numpy_vector_store.py),
+            # otherwise the default JSON stores
+            if NumpyVectorStore.exists(PERSIST_DIR):
+                sentence_index = VectorStoreIndex.from_vector_store(NumpyVectorStore.from_persist_dir(PERSIST_DIR))
+            else:
+                storage_context = StorageContext.from_defaults(persist_dir=PERSIST_DIR)
+                sentence_index = load_index_from_storage(storage_context)
+
+            _ingest_log_records = _replay_ingest_log()
+
+            # The first embedding call loads the model weights; pay for it here, not in the first query
+            Settings.embed_model.get_query_embedding("warm up")
+
+            # the target key defaults to `window` to match the node_parser's default
+            node_postprocessors = [
+                MetadataReplacementPostProcessor(target_metadata_key="window")
+            ]
+            query_engine_kwargs = dict(
+                similarity_top_k=3,
+                context_prompt=CONTEXT_PROMPT,
+                node_postprocessors=node_postprocessors,
+            )
+
+            # Same retrieval and prompt, but the synthesizer yields tokens as the LLM produces them
+            streaming_query_engine = sentence_index.as_query_engine(streaming=True, **query_engine_kwargs)
+            query_engine = sentence_index.as_query_engine(**query_engine_kwargs)
+        except Exception as e:
+            _init_error = str(e)
+            raise
+
+        _init_error = None
+        print(f"Index loaded in {time.perf_counter() - started:.1f}s")
+
+
+def warm_up():
+    """Runs `initialize()` in the background at startup; a failure is reported by `readiness()`."""
+    try:
+        initialize()
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+
+
+def readiness():
+    """
+    Reports whether the index is loaded and the embedder warmed.
+
+    Returns:
+        dict: `index_loaded`, and `index_error` with the error of the last failed
+              initialization (None otherwise).
+    """
+    return {"index_loaded": query_engine is not None, "index_error": _init_error}
+
+
+def _upsert_document_nodes(doc_id: str, nodes):
+    """Replaces every node of `doc_id` in the live index with `nodes`. Caller holds `index_lock`."""
+    sentence_index.delete_ref_doc(doc_id, delete_from_docstore=True)
+    if nodes:
+        sentence_index.insert_nodes(nodes)
+
+
+def _indexed_doc_ids(document_ids):
+    """
+    Returns the IDs of the indexed paragraphs (`<document ID>:<entry>`) of the source
+    documents `document_ids`. Caller holds `index_lock`.
+    """
+    from numpy_vector_store import NumpyVectorStore
+
+    vector_store = sentence_index.vector_store
+    if isinstance(vector_store, NumpyVectorStore):
+        doc_ids = vector_store.ref_doc_ids()
+    else:
+        doc_ids = sentence_index.docstore.get_all_ref_doc_info() or {}
+
+    prefixes = tuple(f"{document_id}:" for document_id in document_ids)
+    return [doc_id for doc_id in doc_ids if prefixes and doc_id.startswith(prefixes)]
+
+
+def _replay_ingest_log():
+    """
+    Applies the paragraphs ingested since the last full persist. Nodes carry their
+    embeddings, so replaying does not re-embed anything.
+
+    Returns:
+        int: Number of log records applied.
+    """
+    from llama_index.core.schema import TextNode
+
+    if not os.path.exists(INGEST_LOG_PATH):
+        return 0
+
+    records = 0
+    with open(INGEST_LOG_PATH, "rb") as log_file:
+        for line in log_file:
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            _upsert_document_nodes(record["doc_id"], [TextNode.from_dict(node) for node in record["nodes"]])
+            records += 1
+
+    print(f"Replayed {records} ingested documents from {INGEST_LOG_PATH}")
+    return records
+
+
+def compact_index():
+    """
+    Persists the full live index and truncates the ingest log, so startup no longer
+    has to replay it.
+    """
+    from numpy_vector_store import NumpyVectorStore
+
+    global _ingest_log_records
+
+    with index_lock:
+        if isinstance(sentence_index.vector_store, NumpyVectorStore):
+            sentence_index.vector_store.persist(PERSIST_DIR)
+        else:
+            sentence_index.storage_context.persist(persist_dir=PERSIST_DIR)
+        if os.path.exists(INGEST_LOG_PATH):
+            os.remove(INGEST_LOG_PATH)
+        _ingest_log_records = 0
+
+    print("Index compacted")
+
+
+def ingest_paragraph_files(paths, document_id: str, replaces=()):
+    """
+    Adds a source document's summary paragraphs to the live index so they are queryable
+    immediately.
+
+    Each file becomes one document keyed by the source document and the file's position,
+    `<document_id>:<entry>`, with the source document ID in its metadata. Every paragraph
+    the index still holds for `document_id`, or for the documents in `replaces`,
+    is removed, so re-ingesting a document never leaves stale or duplicate nodes. Only the
+    changes, with the new nodes' embeddings, are appended to the ingest log; the full index
+    is re-persisted once the log reaches `config.INGEST_COMPACT_RECORDS` documents.
+
+    Parameters:
+        paths (list): Paths of the paragraph files to ingest, in group order.
+        document_id (str): Content hash identifying the source document.
+        replaces (iterable): IDs of documents this one explicitly replaces, to remove.
+
+    Returns:
+        int: Number of nodes inserted.
+    """
+    from llama_index.core import Document, Settings
+    from llama_index.core.schema import MetadataMode
+
+    global _ingest_log_records
+
+    initialize()
+
+    documents = []
+    for entry, path in enumerate(paths):
+        with open(path, encoding="utf-8") as paragraph_file:
+            file_name = os.path.basename(path)
+            documents.append(Document(
+                text=paragraph_file.read(),
+                id_=f"{document_id}:{entry}",
+                metadata={"file_name": file_name, "document_id": document_id},
+                excluded_embed_metadata_keys=["file_name", "document_id"],
+                excluded_llm_metadata_keys=["file_name", "document_id"],
+            ))
+
+    nodes_by_doc = {document.doc_id: [] for document in documents}
+    nodes = node_parser.get_nodes_from_documents(documents)
+    for node in nodes:
+        nodes_by_doc[node.ref_doc_id].append(node)
+
+    # Embed outside the lock so queries keep running meanwhile
+    batch_size = config.INGEST_EMBED_BATCH_SIZE
+    for start in range(0, len(nodes), batch_size):
+        batch = nodes[start:start + batch_size]
+        embeddings = Settings.embed_model.get_text_embedding_batch(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        )
+        for node, embedding in zip(batch, embeddings):
+            node.embedding = embedding
+
+    with index_lock:
+        # Paragraphs of an earlier run or version that this one doesn't overwrite
+        for doc_id in _indexed_doc_ids([document_id, *replaces]):
+            nodes_by_doc.setdefault(doc_id, [])
+
+        with open(INGEST_LOG_PATH, "ab") as log_file:
+            for doc_id, doc_nodes in nodes_by_doc.items():
+                _upsert_document_nodes(doc_id, doc_nodes)
+                log_file.write(orjson.dumps(
+                    {"doc_id": doc_id, "nodes": [node.to_dict() for node in doc_nodes]},
+                    option=orjson.OPT_NON_STR_KEYS,
+                ))
+                log_file.write(b"\n")
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        _ingest_log_records += len(nodes_by_doc)
+        answer_cache.invalidate()
+
+    print(f"Indexed {len(nodes)} nodes from {len(documents)} paragraphs")
+
+    if _ingest_log_records >= config.INGEST_COMPACT_RECORDS:
+        compact_index()
+
+    return len(nodes)
+
+
+def _retrieve(question: str, embedding, timings: StageTimings):
+    """
+    Retrieves the context nodes for an embedded question, as `query_engine.retrieve` does,
+    timing the vector search and the node postprocessors separately. Only retrieval runs
+    under `index_lock`, so ingestion can't modify the index mid-search.
+    """
+    from llama_index.core import QueryBundle
+
+    query_bundle = QueryBundle(question, embedding=embedding)
+
+    with index_lock:
+        with timings.stage("retrieve"):
+            nodes = query_engine.retriever.retrieve(query_bundle)
+        with timings.stage("postprocess"):
+            for postprocessor in node_postprocessors:
+                nodes = postprocessor.postprocess_nodes(nodes, query_bundle=query_bundle)
+
+    return query_bundle, nodes
+
+
+def _table_answer(question: str):
+    """Answers key/column lookups straight from the stored tables; None routes the question to RAG."""
+    table_store = get_table_store()
+    match = table_store.lookup(question) if table_store is not None else None
+    return match["answer"] if match is not None else None
+
+
+def _record_query(route: str, timings: StageTimings):
+    """Counts a query by the route that answered it ("error" if it failed) and logs its stage timings."""
+    route = route or "error"
+    QUERIES.inc(route=route)
+    log_event("query_timings", route=route, stages=timings.finish())
+
+
+def query_index(question: str):
+    """
+    Answers a question: lookups from the stored tables, then from the answer cache
+    when possible, otherwise through retrieval and the LLM.
+
+    Returns:
+        str: The answer text.
+    """
+    timings = StageTimings(QUERY_STAGE_SECONDS)
+    route = None
+    try:
+        with timings.stage("table_lookup"):
+            answer = _table_answer(question)
+        if answer is not None:
+            route = "table"
+            return answer
+
+        with timings.stage("cache"):
+            answer = answer_cache.get_exact(question)
+        if answer is not None:
+            route = "cache_exact"
+            return answer
+
+        initialize()
+        from llama_index.core import Settings
+
+        version = answer_cache.version
+        with timings.stage("embed"):
+            embedding = Settings.embed_model.get_agg_embedding_from_queries([question])
+        with timings.stage("cache"):
+            answer = answer_cache.get_semantic(embedding)
+        if answer is not None:
+            route = "cache_semantic"
+            return answer
+
+        query_bundle, nodes = _retrieve(question, embedding, timings)
+        with timings.stage("generate"):
+            answer = query_engine.synthesize(query_bundle, nodes).response or ""
+
+        answer_cache.put(question, embedding, answer, version)
+        route = "rag"
+        return answer
+    finally:
+        _record_query(route, timings)
+
+
+def stream_query_index(question: str):
+    """
+    Answers a question with the streaming query engine. Table lookups and cached answers
+    are yielded as a single chunk; fresh answers are cached once fully streamed.
+
+    Returns:
+        generator: Yields the answer's text chunks as the LLM produces them.
+    """
+    timings = StageTimings(QUERY_STAGE_SECONDS)
+    route = None
+    streaming = False
+    try:
+        with timings.stage("table_lookup"):
+            answer = _table_answer(question)
+        if answer is not None:
+            route = "table"
+            return iter([answer])
+
+        with timings.stage("cache"):
+            answer = answer_cache.get_exact(question)
+        if answer is not None:
+            route = "cache_exact"
+            return iter([answer])
+
+        initialize()
+        from llama_index.core import Settings
+
+        version = answer_cache.version
+        with timings.stage("embed"):
+            embedding = Settings.embed_model.get_agg_embedding_from_queries([question])
+        with timings.stage("cache"):
+            answer = answer_cache.get_semantic(embedding)
+        if answer is not None:
+            route = "cache_semantic"
+            return iter([answer])
+
+        query_bundle, nodes = _retrieve(question, embedding, timings)
+        with timings.stage("generate"):
+            response_gen = streaming_query_engine.synthesize(query_bundle, nodes).response_gen
+        streaming = True
+    finally:
+        if not streaming:
+            _record_query(route, timings)
+
+    def cached_stream():
+        # Generation time is the time spent producing chunks, not the client's pace of reading them
+        completed = False
+        try:
+            chunks = []
+            for chunk in timings.iter("generate", response_gen):
+                chunks.append(chunk)
+                yield chunk
+            answer_cache.put(question, embedding, "".join(chunks), version)
+            completed = True
+        finally:
+            _record_query("rag" if completed else None, timings)
+
+    return cached_stream()
@@ -0,0 +1,134 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(question: str):
+    """
+    Normalizes a question for exact matching: lowercase, collapsed whitespace and no
+    trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+
+class AnswerCache:
+    """
+    Two-tier cache of query answers.
+
+    The exact tier matches the normalized question text. The semantic tier reuses an
+    answer when the question embedding's cosine similarity to a cached question is at
+    least `similarity_threshold`. Entries expire after `ttl` seconds, the least recently
+    used are evicted beyond `max_entries`, and `invalidate()` drops everything when the
+    index changes.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.version = 0
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized question -> (answer, unit embedding, expiry)
+        self._matrix = None  # stacked unit embeddings of `_entries`, rebuilt lazily
+        self._keys = []
+
+    def _expire(self, now: float):
+        expired = [key for key, (_, _, expires) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def get_exact(self, question: str):
+        """Returns the cached answer for the same normalized question, or None."""
+        if self.max_entries <= 0:
+            return None
+
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                return None
+
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+    def get_semantic(self, embedding):
+        """
+        Returns the answer of the most similar cached question if it is within the
+        similarity threshold, or None (counted as a miss).
+        """
+        if self.max_entries <= 0:
+            return None
+
+        with self._lock:
+            self._expire(time.monotonic())
+
+            if self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[key][1] for key in self._keys])
+
+                query = np.asarray(embedding, dtype=np.float32)
+                similarities = self._matrix @ (query / (np.linalg.norm(query) or 1.0))
+                best = int(np.argmax(similarities))
+
+                if similarities[best] >= self.similarity_threshold:
+                    key = self._keys[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return self._entries[key][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, embedding, answer: str, version: int):
+        """
+        Caches an answer. Ignored if the cache was invalidated since `version` was read,
+        so answers computed against an older index are never stored.
+        """
+        if self.max_entries <= 0:
+            return
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        with self._lock:
+            if version != self.version:
+                return
+
+            key = normalize_question(question)
+            self._entries[key] = (answer, vector, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        """Drops every cached answer; called whenever the index changes."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.version += 1
+
+    def stats(self):
+        """Returns hit and miss counters, hit rates and the number of cached answers."""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "exact_hit_rate": self.exact_hits / lookups if lookups else 0.0,
+                "semantic_hit_rate": self.semantic_hits / lookups if lookups else 0.0,
+            }
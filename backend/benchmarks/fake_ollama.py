@@ -0,0 +1,218 @@
+"""
+Local stand-in for the Ollama HTTP API, for load tests without a GPU or a model.
+
+Implements the endpoints `ChatOllama` (langchain) and `Ollama` (llama-index) use:
+`POST /api/chat` and `POST /api/generate`, streamed as newline-delimited JSON or not,
+plus `GET /api/tags` and `GET /api/version` for the readiness probe. Answers come from
+the benchmark stub model (benchmarks/stub_llm.py), so the pipeline's column-name and
+batched-summary prompts parse as they would with llama3.
+
+Each request waits `--latency` seconds (prompt processing), then produces one word-sized
+token every 1 / `--tokens-per-second` seconds. `--parallel` caps the requests generating
+at once, like OLLAMA_NUM_PARALLEL; the rest queue.
+
+Usage (from the backend directory):
+    python benchmarks/fake_ollama.py [--port 11435] [--latency 0.2] [--tokens-per-second 40]
+        [--parallel 4]
+    ASKHUB_OLLAMA_BASE_URL=http://127.0.0.1:11435 uvicorn main:app
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm import respond  # noqa: E402
+
+TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+class FakeOllama:
+    """Simulated model: answer text, timing and the Ollama response fields."""
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 40.0, parallel: int = 4,
+                 model: str = "llama3"):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.model = model
+        self.slots = threading.Semaphore(parallel)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def tokens(self, prompt: str):
+        answer, _ = respond(prompt)
+        return TOKEN.findall(answer) or [""]
+
+    def generate(self, prompt: str):
+        """
+        Yields the answer's tokens at the simulated speed, holding a generation slot.
+
+        Returns:
+            generator: Token strings; the generator's return value is the final stats dict.
+        """
+        with self._lock:
+            self.requests += 1
+
+        started = time.perf_counter_ns()
+        with self.slots:
+            loaded = time.perf_counter_ns()
+            time.sleep(self.latency)
+            evaluated = time.perf_counter_ns()
+
+            tokens = self.tokens(prompt)
+            interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+            for token in tokens:
+                if interval:
+                    time.sleep(interval)
+                yield token
+        finished = time.perf_counter_ns()
+
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": finished - started,
+            "load_duration": loaded - started,
+            "prompt_eval_count": len(prompt) // 4 + 1,
+            "prompt_eval_duration": evaluated - loaded,
+            "eval_count": len(tokens),
+            "eval_duration": finished - evaluated,
+        }
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOllama/1.0"
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, body, status: int = 200):
+        payload = orjson.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_chunk(self, body):
+        payload = orjson.dumps(body) + b"\n"
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{
+                "name": f"{self.fake.model}:latest", "model": f"{self.fake.model}:latest",
+                "modified_at": _now(), "size": 0, "digest": "fake",
+                "details": {"format": "gguf", "family": "llama", "parameter_size": "8B"},
+            }]})
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path == "/":
+            self._send_json("Ollama is running")
+        else:
+            self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        request = orjson.loads(self.rfile.read(length) or b"{}")
+        chat = self.path == "/api/chat"
+        if chat:
+            prompt = "\n".join(str(message.get("content") or "") for message in request.get("messages", []))
+        else:
+            prompt = request.get("prompt", "")
+        model = request.get("model") or self.fake.model
+
+        def fields(text):
+            if chat:
+                return {"message": {"role": "assistant", "content": text}}
+            return {"response": text}
+
+        stream = self.fake.generate(prompt)
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                while True:
+                    token = next(stream)
+                    self._send_chunk({"model": model, "created_at": _now(), **fields(token), "done": False})
+            except StopIteration as stop:
+                final = stop.value
+            self._send_chunk({"model": model, "created_at": _now(), **fields(""), **final})
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        text = []
+        try:
+            while True:
+                text.append(next(stream))
+        except StopIteration as stop:
+            final = stop.value
+        self._send_json({"model": model, "created_at": _now(), **fields("".join(text)), **final})
+
+
+def serve(host: str = "127.0.0.1", port: int = 11435, verbose: bool = False, **model_options):
+    """
+    Creates the fake Ollama server; call `serve_forever()` on it, or run it in a thread.
+
+    Parameters:
+        host (str): Interface to listen on.
+        port (int): Port to listen on; 0 picks a free one (see `server.server_address`).
+        verbose (bool): Log every request.
+        **model_options: `latency`, `tokens_per_second`, `parallel` and `model` for `FakeOllama`.
+
+    Returns:
+        ThreadingHTTPServer: The server.
+    """
+    server = ThreadingHTTPServer((host, port), OllamaHandler)
+    server.daemon_threads = True
+    server.fake = FakeOllama(**model_options)
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama API for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="Generation speed; 0 = instant.")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests generating at once; the rest queue.")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.verbose, latency=args.latency,
+                   tokens_per_second=args.tokens_per_second, parallel=args.parallel, model=args.model)
+    print(f"Fake Ollama listening on http://{args.host}:{server.server_address[1]} "
+          f"(latency {args.latency}s, {args.tokens_per_second} tokens/s, {args.parallel} parallel)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
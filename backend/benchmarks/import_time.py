@@ -0,0 +1,81 @@
+"""
+Checks that importing the server stays cheap, so uvicorn accepts connections (and
+--reload restarts) without waiting for models, the index or heavy libraries.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and fails if the
+import takes longer than the budget, or if any module that must load lazily (llama-index,
+langchain, pdfplumber, torch, ...) was imported.
+
+Usage (from the backend directory):
+    python benchmarks/import_time.py [--budget SECONDS] [--module main] [--top 15]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded in the background warm-up or by the pipeline stage that needs them, never on import
+LAZY_MODULES = ("llama_index", "langchain", "langchain_core", "langchain_ollama", "pdfplumber",
+                "torch", "transformers", "sentence_transformers")
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(module: str):
+    """
+    Imports `module` in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        list: (cumulative microseconds, nesting depth, module name) per imported module,
+              in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing '{module}' failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            imports.append((int(match.group(2)), (len(match.group(3)) - 1) // 2, match.group(4)))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if importing the server exceeds a time budget.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget", type=float, default=1.5, help="Seconds allowed for the import.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest direct imports to list.")
+    args = parser.parse_args()
+
+    imports = measure_imports(args.module)
+    total = next(cumulative for cumulative, _, name in imports if name == args.module) / 1e6
+    eager = sorted({name for _, _, name in imports if name.split(".")[0] in LAZY_MODULES})
+
+    print(f"import {args.module}: {total:.3f}s (budget {args.budget:.3f}s)")
+    print(f"Slowest imports made by {args.module}:")
+    direct = sorted((entry for entry in imports if entry[1] == 1), reverse=True)[:args.top]
+    for cumulative, _, name in direct:
+        print(f"  {cumulative / 1e6:8.3f}s  {name}")
+
+    failed = False
+    if total > args.budget:
+        print(f"FAIL: import took {total:.3f}s, over the {args.budget:.3f}s budget")
+        failed = True
+    if eager:
+        print(f"FAIL: modules that should load lazily were imported: {', '.join(eager[:10])}")
+        failed = True
+
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Concurrent load test of the HTTP API with mixed query, streaming-query and upload traffic.
+
+Drives a running backend (typically pointed at benchmarks/fake_ollama.py) and reports,
+per request type, p50/p95/p99 latency, throughput and error rate; for streamed queries
+also the time to the first token. While the load runs it samples `/metrics` for the
+query pool's queue depth and queued jobs, and times `/healthz`, whose latency is the
+event loop's lag: raise the load until one of them climbs to find what saturates first.
+
+Closed loop by default (`--concurrency` clients issuing requests back to back); with
+`--rate`, requests arrive at that rate whatever the latency (open loop).
+
+Usage (from the backend directory):
+    python benchmarks/fake_ollama.py --latency 0.2 --tokens-per-second 40 &
+    ASKHUB_OLLAMA_BASE_URL=http://127.0.0.1:11435 uvicorn main:app &
+    python benchmarks/load_test.py [--url http://127.0.0.1:8000] [--duration 60]
+        [--concurrency 16 | --rate 5] [--mix query=8,stream=1,upload=1] [--output report.json]
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_pdf  # noqa: E402
+from pipeline_benchmark import git_revision  # noqa: E402
+
+QUESTIONS = (
+    "Who is the head of the Finance Department?",
+    "What is the phone number of the Health Department?",
+    "Which officers work in the Revenue Department?",
+    "List the offices of the Planning Department.",
+    "What grade does the Education secretary hold?",
+    "Where is the Transport Department located?",
+)
+
+QUEUE_DEPTH = re.compile(r"^askhub_query_queue_depth (\S+)$", re.MULTILINE)
+JOBS = re.compile(r'^askhub_jobs\{status="(queued|running)"\} (\S+)$', re.MULTILINE)
+
+
+def percentile(values: list, percent: float):
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def parse_mix(mix: str):
+    """Parses "query=8,stream=1,upload=1" into request types and weights."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("query", "stream", "upload"):
+            raise argparse.ArgumentTypeError(f"unknown request type '{name}'")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class LoadTest:
+    """Issues the requests and keeps one result record per request."""
+
+    def __init__(self, client: httpx.AsyncClient, cacheable: bool = False, upload_pages: int = 4):
+        self.client = client
+        self.cacheable = cacheable
+        self.upload_pages = upload_pages
+        self.results = []
+        self._numbers = itertools.count()
+
+    def _question(self):
+        number = next(self._numbers)
+        question = QUESTIONS[number % len(QUESTIONS)]
+        # Numbered questions miss the answer cache, so every query reaches retrieval and the LLM
+        return question if self.cacheable else f"{question} (request {number})"
+
+    async def _timed(self, kind: str, request):
+        started = time.perf_counter()
+        record = {"kind": kind, "started": started}
+        try:
+            record.update(await request())
+        except httpx.HTTPError as e:
+            record.update(ok=False, status=None, error=type(e).__name__)
+        record["latency"] = time.perf_counter() - started
+        self.results.append(record)
+
+    async def query(self):
+        async def request():
+            response = await self.client.post("/query/", json={"user_input": self._question()})
+            return {"ok": response.status_code == 200, "status": response.status_code}
+
+        await self._timed("query", request)
+
+    async def stream(self):
+        started = time.perf_counter()
+
+        async def request():
+            first_token = None
+            failed = False
+            async with self.client.stream("POST", "/query/stream/", json={"user_input": self._question()}) as response:
+                async for line in response.aiter_lines():
+                    if line.startswith("data: {\"token\"") and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif line.startswith("event: error"):
+                        failed = True
+            return {"ok": response.status_code == 200 and not failed, "status": response.status_code,
+                    "first_token": first_token}
+
+        await self._timed("stream", request)
+
+    async def upload(self):
+        # Every upload is a different document, so the duplicate check never short-circuits it
+        seed = next(self._numbers)
+        pdf = await asyncio.to_thread(self._make_pdf, seed)
+
+        async def request():
+            response = await self.client.post(
+                "/process-pdf/", files={"file": (f"load-{seed}.pdf", pdf, "application/pdf")},
+            )
+            return {"ok": response.status_code == 200, "status": response.status_code}
+
+        await self._timed("upload", request)
+
+    def _make_pdf(self, seed: int):
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+            synthetic_pdf.generate_pdf(pdf_file.name, pages=self.upload_pages, tables=1, rows_per_page=20,
+                                       seed=seed)
+            return pdf_file.read()
+
+
+async def sample_server(client: httpx.AsyncClient, stop: asyncio.Event, interval: float = 0.5):
+    """
+    Polls `/metrics` and times `/healthz` until `stop` is set.
+
+    Returns:
+        dict: Query queue depth, queued and running jobs, and `/healthz` latency samples.
+    """
+    samples = {"query_queue_depth": [], "jobs_queued": [], "jobs_running": [], "healthz_seconds": []}
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            await client.get("/healthz")
+            samples["healthz_seconds"].append(time.perf_counter() - started)
+
+            text = (await client.get("/metrics")).text
+            depth = QUEUE_DEPTH.search(text)
+            if depth:
+                samples["query_queue_depth"].append(float(depth.group(1)))
+            jobs = dict(JOBS.findall(text))
+            if jobs:
+                samples["jobs_queued"].append(float(jobs.get("queued", 0)))
+                samples["jobs_running"].append(float(jobs.get("running", 0)))
+        except httpx.HTTPError:
+            pass
+
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+    return samples
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    """Waits for `/readyz` to return 200; raises after `timeout` seconds."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/readyz")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1)
+    raise RuntimeError(f"Backend not ready after {timeout:.0f}s")
+
+
+async def run_load(url: str, duration: float, mix: dict, concurrency: int = 8, rate: float = None,
+                   cacheable: bool = False, upload_pages: int = 4, timeout: float = 600.0,
+                   ready_timeout: float = 120.0, seed: int = 0):
+    """
+    Runs the load for `duration` seconds and waits for the requests still in flight.
+
+    Returns:
+        dict: The report: per request type latency percentiles, throughput and error rate,
+              and the server samples.
+    """
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client, \
+            httpx.AsyncClient(base_url=url, timeout=30) as probe_client:
+        await wait_until_ready(probe_client, ready_timeout)
+
+        load = LoadTest(client, cacheable, upload_pages)
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_server(probe_client, stop))
+        started = time.perf_counter()
+        deadline = started + duration
+
+        def next_request():
+            return getattr(load, rng.choices(kinds, weights)[0])()
+
+        if rate:
+            # Open loop: arrivals don't wait for earlier requests to finish
+            in_flight = set()
+            while time.perf_counter() < deadline:
+                task = asyncio.create_task(next_request())
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                await asyncio.sleep(rng.expovariate(rate))
+            await asyncio.gather(*in_flight)
+        else:
+            async def client_loop():
+                while time.perf_counter() < deadline:
+                    await next_request()
+
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+        elapsed = time.perf_counter() - started
+        stop.set()
+        samples = await sampler
+
+    report = {}
+    for kind in kinds:
+        records = [record for record in load.results if record["kind"] == kind]
+        latencies = [record["latency"] for record in records if record["ok"]]
+        errors = [record for record in records if not record["ok"]]
+        entry = {
+            "requests": len(records),
+            "errors": len(errors),
+            "error_rate": len(errors) / len(records) if records else 0.0,
+            "throughput_per_second": len(latencies) / elapsed,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "latency_max": max(latencies) if latencies else None,
+            "error_statuses": sorted({str(record.get("status") or record.get("error")) for record in errors}),
+        }
+        if kind == "stream":
+            first_tokens = [record["first_token"] for record in records if record["ok"] and record["first_token"]]
+            entry["first_token_p50"] = percentile(first_tokens, 50)
+            entry["first_token_p95"] = percentile(first_tokens, 95)
+        report[kind] = entry
+
+    server = {}
+    for name, values in samples.items():
+        server[name] = {"mean": statistics.fmean(values) if values else None,
+                        "max": max(values) if values else None,
+                        "p95": percentile(values, 95)}
+
+    return {"elapsed_seconds": elapsed, "requests": report, "server": server}
+
+
+def print_report(report: dict):
+    options = report["options"]
+    mode = f"rate {options['rate']}/s" if options["rate"] else f"concurrency {options['concurrency']}"
+    print(f"revision {report['revision']}, {options['duration']}s, {mode}, mix {options['mix']}")
+    print(f"{'type':<8}{'requests':>10}{'errors':>8}{'req/s':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}")
+
+    def seconds(value):
+        return f"{value:>9.3f}" if value is not None else f"{'-':>9}"
+
+    for kind, entry in report["requests"].items():
+        print(f"{kind:<8}{entry['requests']:>10}{entry['errors']:>8}{entry['throughput_per_second']:>8.2f}"
+              f"{seconds(entry['latency_p50'])}{seconds(entry['latency_p95'])}"
+              f"{seconds(entry['latency_p99'])}{seconds(entry['latency_max'])}")
+        if entry["errors"]:
+            print(f"  errors: {', '.join(entry['error_statuses'])}")
+        if kind == "stream":
+            print(f"  first token p50{seconds(entry['first_token_p50'])}  p95{seconds(entry['first_token_p95'])}")
+
+    server = report["server"]
+    for name, label in (("healthz_seconds", "/healthz latency (event loop lag)"),
+                        ("query_queue_depth", "query pool queue depth"),
+                        ("jobs_queued", "queued jobs"), ("jobs_running", "running jobs")):
+        if server[name]["max"] is not None:
+            print(f"{label}: mean {server[name]['mean']:.3f}, p95 {server[name]['p95']:.3f}, "
+                  f"max {server[name]['max']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend with mixed query and upload traffic.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to generate load for.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop clients.")
+    parser.add_argument("--rate", type=float, help="Open-loop arrivals per second (overrides --concurrency).")
+    parser.add_argument("--mix", type=parse_mix, default="query=8,stream=1,upload=1",
+                        help="Request types and weights, e.g. query=8,stream=1,upload=1.")
+    parser.add_argument("--cacheable", action="store_true",
+                        help="Repeat the same questions, so the answer cache can serve them.")
+    parser.add_argument("--upload-pages", type=int, default=4, help="Pages per uploaded synthetic PDF.")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds before a request counts as failed.")
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="Seconds to wait for /readyz.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.url, args.duration, args.mix, args.concurrency, args.rate, args.cacheable,
+                                  args.upload_pages, args.timeout, args.ready_timeout, args.seed))
+    report = {
+        "revision": git_revision(),
+        "options": {"url": args.url, "duration": args.duration, "concurrency": args.concurrency,
+                    "rate": args.rate, "mix": args.mix, "cacheable": args.cacheable,
+                    "upload_pages": args.upload_pages},
+        **report,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "wb") as report_file:
+            report_file.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
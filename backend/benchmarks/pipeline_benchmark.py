@@ -0,0 +1,331 @@
+"""
+Offline benchmark of the table-to-paragraph pipeline on a synthetic PDF, with the stub
+LLM (benchmarks/stub_llm.py) in place of Ollama.
+
+Each stage of `process_pdf_to_paragraph` is run to completion on its own, in pipeline
+order, recording its wall time, peak RSS, files written and LLM calls. The whole
+pipeline is then run end to end (streamed, as the server runs it) for its total time and
+the stage times it logs. The summary cache is disabled, so every run does the same work.
+
+The JSON report records the git revision, the PDF and stub options and the median of
+`--repeat` runs, so reports from different commits can be compared with `--compare`.
+
+Usage (from the backend directory):
+    python benchmarks/pipeline_benchmark.py [--pages 24 --tables 3 ...] [--latency 0.05]
+        [--repeat 3] [--output report.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import io
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import orjson
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import stub_llm  # noqa: E402
+import synthetic_pdf  # noqa: E402
+
+# Pipeline stages, in order, named as in the `pipeline_timings` log line
+STAGES = ("extract", "headers", "column_names", "segment", "combine", "fill", "group", "summarize")
+
+
+class RSSSampler:
+    """Samples this process's resident set size in the background to find per-stage peaks."""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.peak = 0
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def current(self):
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * self._page_size
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def reset(self):
+        """Starts a new peak from the current RSS and returns it."""
+        self.peak = self.current()
+        return self.peak
+
+    def __enter__(self):
+        self.reset()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def _files(directory: str):
+    paths = set()
+    for root, _, files in os.walk(directory):
+        paths.update(os.path.join(root, name) for name in files)
+    return paths
+
+
+def _llm_calls():
+    return sum(stub_llm.call_counts().values())
+
+
+def run_stages(pdf_path: str, run_dir: str, sampler: RSSSampler):
+    """
+    Runs each pipeline stage to completion in turn.
+
+    Returns:
+        dict: Per stage, its wall seconds, peak RSS, RSS growth, files written and LLM calls.
+    """
+    import table_processing as tp
+
+    results = {}
+    state = {}
+
+    def segments():
+        page_tables = state["extract"]
+        column_pages = tp.extracted_column_pages_json(page_tables)
+        split = tp.split_page_tables(page_tables, state["column_names"], column_pages)
+        return list(tp.resolve_segments(split, page_tables))
+
+    steps = {
+        "extract": lambda: tp.extract_page_tables(pdf_path),
+        "headers": lambda: tp.extract_headers_txt(state["extract"]),
+        "column_names": lambda: tp.resolve_column_patterns_json(state["headers"], state["extract"]),
+        "segment": segments,
+        "combine": lambda: list(tp.iter_segment_tables(state["segment"])),
+        "fill": lambda: list(tp.iter_filled_tables(state["combine"])),
+        "group": lambda: list(tp.iter_logical_groups(state["fill"])),
+        "summarize": lambda: tp.summarize_groups_to_paragraphs(state["group"], "Tables"),
+    }
+
+    for stage in STAGES:
+        files_before = _files(run_dir)
+        calls_before = _llm_calls()
+        rss_before = sampler.reset()
+
+        started = time.perf_counter()
+        state[stage] = steps[stage]()
+        wall = time.perf_counter() - started
+
+        results[stage] = {
+            "wall_seconds": wall,
+            "peak_rss_mb": max(sampler.peak, sampler.current()) / 2**20,
+            "rss_growth_mb": (max(sampler.peak, sampler.current()) - rss_before) / 2**20,
+            "files_written": len(_files(run_dir) - files_before),
+            "llm_calls": _llm_calls() - calls_before,
+        }
+
+    summary_files, failed = state["summarize"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} groups failed to summarize")
+    results["summarize"]["groups"] = len(state["group"])
+    return results
+
+
+def run_end_to_end(pdf_path: str, sampler: RSSSampler):
+    """
+    Runs `process_pdf_to_paragraph` as the server does.
+
+    Returns:
+        dict: Wall seconds, peak RSS, LLM calls and the per-stage seconds the pipeline logged.
+    """
+    import table_processing as tp
+
+    calls_before = _llm_calls()
+    sampler.reset()
+    output = io.StringIO()
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        summary_files = tp.process_pdf_to_paragraph(pdf_path)
+    wall = time.perf_counter() - started
+
+    stages = {}
+    for line in output.getvalue().splitlines():
+        if line.startswith("{") and '"pipeline_timings"' in line:
+            stages = orjson.loads(line)["stages"]
+
+    return {
+        "wall_seconds": wall,
+        "peak_rss_mb": max(sampler.peak, sampler.current()) / 2**20,
+        "files_written": len(summary_files),
+        "llm_calls": _llm_calls() - calls_before,
+        "stage_seconds": stages,
+    }
+
+
+def git_revision():
+    """Returns the current commit, with "-dirty" appended if the tree has local changes, or None."""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{revision}-dirty" if dirty else revision
+
+
+def _median_report(runs: list, keys: tuple):
+    """Median of each numeric field across runs, per key."""
+    report = {}
+    for key in keys:
+        fields = runs[0][key]
+        report[key] = {
+            field: statistics.median(run[key][field] for run in runs)
+            for field, value in fields.items() if isinstance(value, (int, float))
+        }
+    return report
+
+
+def benchmark(pdf_options: dict, repeat: int = 1, latency: float = 0.0, per_token_latency: float = 0.0,
+              concurrency: int = None, batch_tokens: int = None, extract_workers: int = None,
+              end_to_end: bool = True):
+    """
+    Generates the PDF and runs the stage and end-to-end benchmarks `repeat` times, each
+    in a fresh temporary directory.
+
+    Returns:
+        dict: The report: environment, options, and the median of the runs' measurements.
+    """
+    stub_llm.install()
+    stub_llm.configure(latency, per_token_latency)
+
+    import config
+
+    config.SUMMARY_CACHE_PATH = ""
+    config.DEBUG_DUMP_DIR = None
+    if concurrency is not None:
+        config.SUMMARY_CONCURRENCY = concurrency
+    if batch_tokens is not None:
+        config.SUMMARY_BATCH_TOKENS = batch_tokens
+    if extract_workers is not None:
+        config.EXTRACT_WORKERS = extract_workers
+
+    stage_runs, end_to_end_runs = [], []
+    original_dir = os.getcwd()
+    with RSSSampler() as sampler:
+        for _ in range(repeat):
+            run_dir = tempfile.mkdtemp(prefix="askhub-bench-")
+            try:
+                os.chdir(run_dir)
+                pdf_path = os.path.join(run_dir, "synthetic.pdf")
+                synthetic_pdf.generate_pdf(pdf_path, **pdf_options)
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stage_runs.append(run_stages(pdf_path, run_dir, sampler))
+
+                if end_to_end:
+                    shutil.rmtree(os.path.join(run_dir, "Tables"), ignore_errors=True)
+                    end_to_end_runs.append({"end_to_end": run_end_to_end(pdf_path, sampler)})
+            finally:
+                os.chdir(original_dir)
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "pdf": pdf_options,
+        "llm": {"latency": latency, "per_token_latency": per_token_latency},
+        "config": {
+            "summary_concurrency": config.SUMMARY_CONCURRENCY,
+            "summary_batch_tokens": config.SUMMARY_BATCH_TOKENS,
+            "extract_workers": config.EXTRACT_WORKERS,
+            "header_classifier": config.HEADER_CLASSIFIER,
+        },
+        "repeat": repeat,
+        "stages": _median_report(stage_runs, STAGES),
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+    if end_to_end_runs:
+        report["end_to_end"] = _median_report(end_to_end_runs, ("end_to_end",))["end_to_end"]
+        report["end_to_end"]["stage_seconds"] = {
+            stage: statistics.median(run["end_to_end"]["stage_seconds"].get(stage, 0.0) for run in end_to_end_runs)
+            for stage in STAGES
+        }
+    return report
+
+
+def print_report(report: dict, baseline: dict = None):
+    """Prints the per-stage table, with the change against `baseline` if given."""
+    print(f"revision {report['revision']}, {report['repeat']} run(s), pdf {report['pdf']}, llm {report['llm']}")
+    header = f"{'stage':<14}{'wall s':>10}{'peak MB':>10}{'+RSS MB':>10}{'files':>8}{'LLM calls':>11}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+
+    for stage in STAGES:
+        result = report["stages"][stage]
+        line = (f"{stage:<14}{result['wall_seconds']:>10.4f}{result['peak_rss_mb']:>10.1f}"
+                f"{result['rss_growth_mb']:>10.1f}{result['files_written']:>8.0f}{result['llm_calls']:>11.0f}")
+        if baseline and stage in baseline.get("stages", {}):
+            before = baseline["stages"][stage]["wall_seconds"]
+            line += f"{result['wall_seconds'] / before:>9.2f}x" if before else f"{'-':>10}"
+        print(line)
+
+    if "end_to_end" in report:
+        result = report["end_to_end"]
+        line = (f"{'end to end':<14}{result['wall_seconds']:>10.4f}{result['peak_rss_mb']:>10.1f}"
+                f"{'':>10}{result['files_written']:>8.0f}{result['llm_calls']:>11.0f}")
+        if baseline and "end_to_end" in baseline and baseline["end_to_end"]["wall_seconds"]:
+            line += f"{result['wall_seconds'] / baseline['end_to_end']['wall_seconds']:>9.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF pipeline offline with a stub LLM.")
+    synthetic_pdf.add_arguments(parser)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per LLM call.")
+    parser.add_argument("--per-token-latency", type=float, default=0.0,
+                        help="Simulated seconds per generated token.")
+    parser.add_argument("--concurrency", type=int, help="Concurrent summarization calls.")
+    parser.add_argument("--batch-tokens", type=int, help="Token budget for batched summary prompts.")
+    parser.add_argument("--extract-workers", type=int, help="Extraction processes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the median of.")
+    parser.add_argument("--no-end-to-end", dest="end_to_end", action="store_false",
+                        help="Only run the stages one by one.")
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--compare", help="Earlier JSON report to compare wall times against.")
+    args = parser.parse_args()
+
+    pdf_options = {
+        "pages": args.pages, "tables": args.tables, "columns": args.columns, "rows_per_page": args.rows_per_page,
+        "blank_ratio": args.blank_ratio, "repeat_header": args.repeat_header,
+        "text_pages": args.text_pages, "seed": args.seed,
+    }
+    report = benchmark(pdf_options, args.repeat, args.latency, args.per_token_latency, args.concurrency,
+                       args.batch_tokens, args.extract_workers, args.end_to_end)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "rb") as baseline_file:
+            baseline = orjson.loads(baseline_file.read())
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "wb") as report_file:
+            report_file.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
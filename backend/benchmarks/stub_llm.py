@@ -0,0 +1,125 @@
+"""
+Deterministic stand-in for `ChatOllama`, so the pipeline can be benchmarked without
+Ollama or a network.
+
+`install()` makes `from langchain_ollama import ChatOllama` return `StubChatModel`. The
+stub answers the pipeline's three prompts the way llama3 is asked to:
+
+- column names: echoes the candidate rows written in capitals, as the headers of
+  `synthetic_pdf` are, as a JSON array
+- single summaries: joins the group's values into one sentence
+- batched summaries: one such sentence per group, under its "### GROUP <n>" marker
+
+Each call sleeps `latency + per_token_latency * completion tokens` seconds to simulate
+generation, and reports Ollama-style token counts so the metrics callbacks see them.
+"""
+import re
+import sys
+import threading
+import time
+import types
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+GROUP_MARKER = re.compile(r"^[ \t]*### GROUP (\d+)[ \t]*$", re.MULTILINE)
+QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+# Simulated generation time; set with `configure()`
+settings = {"latency": 0.0, "per_token_latency": 0.0}
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def configure(latency: float = 0.0, per_token_latency: float = 0.0):
+    """Sets the simulated seconds per call and per completion token."""
+    settings["latency"] = latency
+    settings["per_token_latency"] = per_token_latency
+
+
+def call_counts():
+    """Returns the number of calls made so far per prompt kind."""
+    with _calls_lock:
+        return dict(_calls)
+
+
+def _tokens(text: str):
+    return len(text) // 4 + 1
+
+
+def _sentence(content: str):
+    values = [value.replace("\\n", " ") for value in QUOTED.findall(content) if value.strip()]
+    return "The group lists " + ", ".join(values) + "." if values else "The group is empty."
+
+
+def _is_header(row: str):
+    # Headers are written in capitals, digits allowed; every data row has lowercase words.
+    # JSON escapes such as "\n" don't count as letters.
+    text = re.sub(r"\\.", "", row)
+    return bool(re.search(r"[A-Z]", text)) and not re.search(r"[a-z]", text)
+
+
+def _column_names(prompt: str):
+    data = prompt.split("### Input JSON Data:", 1)[-1].split("### OUTPUT FORMAT:", 1)[0]
+    rows = re.findall(r"\[([^\[\]]*)\]", data)
+    names = [row for row in rows if _is_header(row)]
+    return "[\n" + ",\n".join(f"    [{row.strip()}]" for row in names) + "\n]"
+
+
+def respond(prompt: str):
+    """
+    Returns the stub's answer to a prompt and the kind of prompt it was.
+
+    Returns:
+        tuple: The answer text and "column_names", "summarize_batch" or "summarize".
+    """
+    if "### Input JSON Data:" in prompt:
+        return _column_names(prompt), "column_names"
+
+    markers = list(GROUP_MARKER.finditer(prompt))
+    if markers:
+        paragraphs = []
+        for position, marker in enumerate(markers):
+            end = markers[position + 1].start() if position + 1 < len(markers) else len(prompt)
+            paragraphs.append(f"### GROUP {marker.group(1)}\n{_sentence(prompt[marker.end():end])}")
+        return "\n\n".join(paragraphs), "summarize_batch"
+
+    return _sentence(prompt), "summarize"
+
+
+class StubChatModel(BaseChatModel):
+    """Accepts the `ChatOllama` arguments the pipeline passes and answers with `respond()`."""
+
+    model: str = "stub"
+    base_url: Any = None
+    temperature: Any = None
+    client_kwargs: Any = None
+
+    @property
+    def _llm_type(self):
+        return "stub-ollama"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        answer, kind = respond(prompt)
+
+        with _calls_lock:
+            _calls[kind] = _calls.get(kind, 0) + 1
+
+        completion_tokens = _tokens(answer)
+        delay = settings["latency"] + settings["per_token_latency"] * completion_tokens
+        if delay > 0:
+            time.sleep(delay)
+
+        info = {"prompt_eval_count": _tokens(prompt), "eval_count": completion_tokens}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer), generation_info=info)])
+
+
+def install():
+    """Makes `langchain_ollama.ChatOllama` resolve to the stub for every later import."""
+    module = types.ModuleType("langchain_ollama")
+    module.ChatOllama = StubChatModel
+    sys.modules["langchain_ollama"] = module
@@ -0,0 +1,233 @@
+"""
+Generates synthetic multi-table PDFs shaped like the directories the pipeline is built
+for: bordered tables whose first column groups rows through vertically merged (blank)
+cells, continuing across pages, optionally between narrative pages without ruling lines
+(front matter and annexes).
+
+The PDF is written directly (Helvetica, one content stream per page), so no PDF library
+is needed, and the same options and seed always give byte-identical output.
+
+Usage (from the backend directory):
+    python benchmarks/synthetic_pdf.py out.pdf [--pages 12] [--tables 2] [--columns 4]
+        [--rows-per-page 30] [--blank-ratio 0.5] [--no-repeat-header] [--text-pages 0] [--seed 0]
+"""
+import argparse
+import random
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 842
+MARGIN = 36
+ROW_HEIGHT = 18
+FONT_SIZE = 7
+TEXT_LINES_PER_PAGE = 60
+TEXT_WORDS_PER_LINE = 14
+
+HEADER_WORDS = (
+    "DEPARTMENT", "DIVISION", "HEAD", "OFFICER", "DESIGNATION", "GRADE", "PHONE", "EXTENSION", "CITY",
+    "DISTRICT", "OFFICE", "ADDRESS", "SECTION", "BRANCH", "EMAIL", "FAX", "ROOM", "WING",
+)
+VALUE_WORDS = (
+    "Finance", "Health", "Education", "Revenue", "Planning", "Works", "Housing", "Transport", "Energy",
+    "Agriculture", "Forests", "Labour", "Industries", "Tourism", "Culture", "Sports", "Youth", "Audit",
+)
+
+
+def _escape(text: str):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_tables(tables: int, columns: int, rows: int, blank_ratio: float, seed: int):
+    """
+    Builds the tables' headers and rows.
+
+    The first column names the group a row belongs to and is left blank on follow-up rows
+    of the same group (a merged cell in the source), with probability `blank_ratio` per
+    row. Every table has its own header, so the pipeline splits them apart.
+
+    Returns:
+        list: (header, rows) per table.
+    """
+    rng = random.Random(seed)
+    result = []
+    for table in range(tables):
+        words = rng.sample(HEADER_WORDS, min(columns, len(HEADER_WORDS)))
+        header = [f"{word} {table + 1}" if column else f"{word}\nOF TABLE {table + 1}"
+                  for column, word in enumerate(words)]
+        header += [f"FIELD {column + 1}" for column in range(len(words), columns)]
+
+        table_rows = []
+        group = 0
+        for row in range(rows):
+            if row == 0 or rng.random() >= blank_ratio:
+                group += 1
+                first = f"{rng.choice(VALUE_WORDS)} Department {table + 1}-{group}"
+            else:
+                first = ""
+            cells = [first]
+            for column in range(1, columns):
+                if column == 1:
+                    cells.append(f"Officer {table + 1}-{row + 1}")
+                elif column % 3 == 2:
+                    cells.append(f"{rng.randint(100, 999)}-{rng.randint(1000, 9999)}")
+                else:
+                    cells.append(f"{rng.choice(VALUE_WORDS)} {rng.randint(1, 99)}")
+            table_rows.append(cells)
+        result.append((header, table_rows))
+    return result
+
+
+def layout_pages(tables: list, pages: int, rows_per_page: int, repeat_header: bool = True):
+    """
+    Lays the tables out one after another, `rows_per_page` rows per page. A table that
+    doesn't fit continues on the next page, with its header repeated if `repeat_header`.
+
+    Returns:
+        list: Per page, the (header or None, rows) blocks drawn on it.
+    """
+    laid_out = []
+    for header, rows in tables:
+        for start in range(0, len(rows), rows_per_page):
+            show_header = start == 0 or repeat_header
+            laid_out.append([(header if show_header else None, rows[start:start + rows_per_page])])
+    return laid_out[:pages]
+
+
+def make_text_pages(pages: int, seed: int):
+    """
+    Builds narrative pages: lines of running text and no ruling lines, like a directory's
+    cover, notes and annexes.
+
+    Returns:
+        list: Per page, one block holding the page's text lines.
+    """
+    rng = random.Random(seed + 1)
+    words = [word.lower() for word in HEADER_WORDS + VALUE_WORDS]
+    return [
+        [[" ".join(rng.choice(words) for _ in range(TEXT_WORDS_PER_LINE)) for _ in range(TEXT_LINES_PER_PAGE)]]
+        for _ in range(pages)
+    ]
+
+
+def _text_ops(lines: list):
+    leading = (PAGE_HEIGHT - 2 * MARGIN) / TEXT_LINES_PER_PAGE
+    return [f"BT /F1 {FONT_SIZE + 2} Tf {MARGIN} {PAGE_HEIGHT - MARGIN - (number + 1) * leading:.1f} Td "
+            f"({_escape(line)}) Tj ET" for number, line in enumerate(lines)]
+
+
+def _page_stream(blocks: list):
+    ops = ["0.5 w"]
+    top = PAGE_HEIGHT - MARGIN
+    for block in blocks:
+        if isinstance(block, list):
+            ops.extend(_text_ops(block))
+            continue
+
+        header, rows = block
+        lines = ([header] if header is not None else []) + rows
+        width = (PAGE_WIDTH - 2 * MARGIN) / len(lines[0])
+        for row_number, row in enumerate(lines):
+            y = top - (row_number + 1) * ROW_HEIGHT
+            for column, cell in enumerate(row):
+                x = MARGIN + column * width
+                ops.append(f"{x:.1f} {y:.1f} {width:.1f} {ROW_HEIGHT} re S")
+                if cell:
+                    # Multi-line headers print their first line; pdfplumber reads the cell text as drawn
+                    for line_number, line in enumerate(cell.split("\n")[:2]):
+                        ops.append(f"BT /F1 {FONT_SIZE} Tf {x + 2:.1f} {y + 10 - line_number * 8:.1f} Td "
+                                   f"({_escape(line)}) Tj ET")
+        top -= (len(lines) + 2) * ROW_HEIGHT
+    return "\n".join(ops).encode("latin-1")
+
+
+def write_pdf(path: str, pages: list):
+    """Writes the laid-out pages as a minimal PDF 1.4 file."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for blocks in pages:
+        stream = _page_stream(blocks)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode("latin-1")
+        )
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+
+    with open(path, "wb") as pdf_file:
+        pdf_file.write(output)
+
+
+def generate_pdf(path: str, pages: int = 12, tables: int = 2, columns: int = 4, rows_per_page: int = 30,
+                 blank_ratio: float = 0.5, repeat_header: bool = True, text_pages: int = 0, seed: int = 0):
+    """
+    Writes a synthetic PDF of `tables` tables spread evenly over `pages` pages, plus
+    `text_pages` narrative pages.
+
+    Parameters:
+        path (str): Output path.
+        pages (int): Number of pages.
+        tables (int): Number of distinct tables; each continues over pages // tables pages.
+        columns (int): Columns per table.
+        rows_per_page (int): Table rows drawn per page (at most about 40 fit).
+        blank_ratio (float): Share of rows whose first cell is merged into the row above.
+        repeat_header (bool): Repeat each table's header on its continuation pages.
+        text_pages (int): Narrative pages without tables; half go before the tables and
+                          the rest after them.
+        seed (int): Seed for the cell values.
+
+    Returns:
+        dict: The options used, for benchmark reports.
+    """
+    pages_per_table = max(1, pages // tables)
+    laid_out = make_tables(tables, columns, pages_per_table * rows_per_page, blank_ratio, seed)
+    text = make_text_pages(text_pages, seed)
+    front = text_pages // 2
+    write_pdf(path, text[:front] + layout_pages(laid_out, pages, rows_per_page, repeat_header) + text[front:])
+    return {
+        "pages": pages, "tables": tables, "columns": columns, "rows_per_page": rows_per_page,
+        "blank_ratio": blank_ratio, "repeat_header": repeat_header, "text_pages": text_pages, "seed": seed,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Adds the generator options to a command-line parser."""
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--tables", type=int, default=2)
+    parser.add_argument("--columns", type=int, default=4)
+    parser.add_argument("--rows-per-page", type=int, default=30)
+    parser.add_argument("--blank-ratio", type=float, default=0.5,
+                        help="Share of rows whose first cell is merged into the row above.")
+    parser.add_argument("--no-repeat-header", dest="repeat_header", action="store_false",
+                        help="Don't repeat table headers on continuation pages.")
+    parser.add_argument("--text-pages", type=int, default=0,
+                        help="Narrative pages without tables, before and after the tables.")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic multi-table PDF.")
+    parser.add_argument("path")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    options = generate_pdf(args.path, args.pages, args.tables, args.columns, args.rows_per_page,
+                           args.blank_ratio, args.repeat_header, args.text_pages, args.seed)
+    print(f"Wrote {args.path}: {options}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import shutil
+import threading
+from array import array
+
+import orjson
+
+CHECKPOINT_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+class SpilledRecords:
+    """
+    Read-only sequence over a JSON-lines file that keeps only each record's file offset in
+    memory. Records are read back from disk when iterated or indexed; the last record read
+    by index is kept, since callers tend to read the same one repeatedly.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets = array("q")
+        self._last = (None, None)
+
+        offset = 0
+        with open(path, "rb") as records_file:
+            for line in records_file:
+                self._offsets.append(offset)
+                offset += len(line)
+
+    @classmethod
+    def write(cls, path: str, records):
+        """Writes `records` to `path` one line at a time, atomically, and returns the sequence."""
+        with open(f"{path}.partial", "wb") as records_file:
+            for record in records:
+                records_file.write(orjson.dumps(record, option=CHECKPOINT_OPTIONS) + b"\n")
+        os.replace(f"{path}.partial", path)
+        return cls(path)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self._offsets)
+        if not 0 <= index < len(self._offsets):
+            raise IndexError("record index out of range")
+
+        if self._last[0] != index:
+            with open(self.path, "rb") as records_file:
+                records_file.seek(self._offsets[index])
+                self._last = (index, orjson.loads(records_file.readline()))
+        return self._last[1]
+
+    def __iter__(self):
+        with open(self.path, "rb") as records_file:
+            for line in records_file:
+                yield orjson.loads(line)
+
+
+class PipelineCheckpoint:
+    """
+    Per-document work directory holding the output of each completed pipeline stage,
+    so a restarted or retried job resumes from the last completed stage and the last
+    unfinished group instead of starting over.
+
+    Whole values are written to `<name>.json`; streamed stages are appended to
+    `<name>.jsonl.partial` and renamed to `<name>.jsonl` once complete. Every write
+    is atomic, so a crash never leaves a checkpoint that looks complete but isn't.
+    """
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        self._summary_lock = threading.Lock()
+
+    def _path(self, filename: str, create: bool = False):
+        if create:
+            os.makedirs(self.work_dir, exist_ok=True)
+        return os.path.join(self.work_dir, filename)
+
+    def has(self, name: str):
+        """Returns whether the stage `name` has a complete checkpoint."""
+        return os.path.exists(self._path(f"{name}.json")) or os.path.exists(self._path(f"{name}.jsonl"))
+
+    def value(self, name: str, compute):
+        """
+        Returns the checkpointed value of stage `name`, computing and saving it with
+        `compute()` if the stage hasn't completed yet.
+        """
+        path = self._path(f"{name}.json")
+        if os.path.exists(path):
+            with open(path, "rb") as checkpoint_file:
+                print(f"Resuming from checkpoint '{name}'")
+                return orjson.loads(checkpoint_file.read())
+
+        value = compute()
+
+        path = self._path(f"{name}.json", create=True)
+        with open(f"{path}.tmp", "wb") as checkpoint_file:
+            checkpoint_file.write(orjson.dumps(value, option=CHECKPOINT_OPTIONS))
+        os.replace(f"{path}.tmp", path)
+        return value
+
+    def stream(self, name: str, produce, encode=None, decode=None):
+        """
+        Yields the records of streamed stage `name`: from its checkpoint if the stage
+        completed, otherwise from the generator `produce()` while checkpointing them.
+        Records that aren't plain JSON data are stored as `encode(record)` and restored
+        with `decode(data)`.
+        """
+        path = self._path(f"{name}.jsonl")
+        if os.path.exists(path):
+            print(f"Resuming from checkpoint '{name}'")
+            with open(path, "rb") as checkpoint_file:
+                for line in checkpoint_file:
+                    record = orjson.loads(line)
+                    yield decode(record) if decode is not None else record
+            return
+
+        path = self._path(f"{name}.jsonl", create=True)
+        with open(f"{path}.partial", "wb") as checkpoint_file:
+            for record in produce():
+                data = encode(record) if encode is not None else record
+                checkpoint_file.write(orjson.dumps(data, option=CHECKPOINT_OPTIONS) + b"\n")
+                yield record
+        os.replace(f"{path}.partial", path)
+
+    def records(self, name: str, produce, spill: bool = False):
+        """
+        Returns the checkpointed records of stage `name`, producing them with the generator
+        `produce()` if the stage hasn't completed yet. With `spill`, the records are written
+        to `<name>.jsonl` as they are produced and returned as `SpilledRecords`, so they are
+        never all in memory; otherwise they are returned as a list.
+        """
+        path = self._path(f"{name}.jsonl")
+        if os.path.exists(path):
+            print(f"Resuming from checkpoint '{name}'")
+            return SpilledRecords(path)
+        if not spill or os.path.exists(self._path(f"{name}.json")):
+            return self.value(name, lambda: list(produce()))
+
+        return SpilledRecords.write(self._path(f"{name}.jsonl", create=True), produce())
+
+    def completed_summaries(self):
+        """Returns the paragraphs of the groups already summarized, keyed by group name."""
+        path = self._path("summaries.jsonl")
+        if not os.path.exists(path):
+            return {}
+
+        completed = {}
+        with open(path, "rb") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # Torn last line from a crash mid-write
+                    continue
+                completed[record["name"]] = record["paragraph"]
+        return completed
+
+    def record_summary(self, name: str, paragraph: str):
+        """Appends a finished group summary; safe from the summarizer's worker threads."""
+        with self._summary_lock:
+            with open(self._path("summaries.jsonl", create=True), "ab") as checkpoint_file:
+                checkpoint_file.write(orjson.dumps({"name": name, "paragraph": paragraph}) + b"\n")
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+
+    def remove(self):
+        """Deletes the work directory once the document is fully processed."""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
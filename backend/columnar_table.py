@@ -0,0 +1,155 @@
+import sys
+
+import numpy as np
+
+# str() over an object array, element by element in C
+_to_str = np.frompyfunc(str, 1, 1)
+
+
+def _object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _fill_forward(values):
+    """Replaces None and "" with the last earlier value that is neither; None before the first one."""
+    if not len(values):
+        return values
+
+    valid = (values != None) & (values != "")  # noqa: E711 (elementwise)
+    positions = np.where(valid, np.arange(len(values)), -1)
+    np.maximum.accumulate(positions, out=positions)
+
+    filled = values[positions]
+    filled[positions < 0] = None
+    return filled
+
+
+class ColumnarTable:
+    """
+    A combined table stored column by column, one object array per distinct header.
+
+    Rows read exactly like the `dict(zip(header, row))` row dicts the pipeline used to
+    build for every row: a header that appears twice is one key holding the later cell,
+    and a row shorter than the header lacks the keys past its end. Short rows are tracked
+    with a presence mask per column (None when every row has every column), so rows are
+    only built as dicts when a group or a debug dump needs them.
+    """
+
+    def __init__(self, headers: list, columns: list, present: list = None):
+        self.headers = headers
+        self.columns = columns
+        self.present = present
+
+    @classmethod
+    def from_rows(cls, header: list, rows: list):
+        """
+        Builds the table from its header row and data rows (lists of cells).
+
+        Parameters:
+            header (list): Header cells; string headers are interned, so every table and
+                           group of a document shares one copy of each.
+            rows (list): Data rows; cells past the header's length are ignored.
+        """
+        header = [sys.intern(name) if isinstance(name, str) else name for name in header]
+
+        # Positions of each distinct header, in order of first appearance
+        positions = {}
+        for position, name in enumerate(header):
+            positions.setdefault(name, []).append(position)
+
+        lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+        columns, present = [], []
+
+        if not rows or lengths.min() >= len(header):
+            cells = list(zip(*rows))[:len(header)] if rows else [()] * len(header)
+            for name, name_positions in positions.items():
+                columns.append(_object_array(cells[name_positions[-1]]))
+            return cls(list(positions), columns)
+
+        for name, name_positions in positions.items():
+            if len(name_positions) == 1:
+                position = name_positions[0]
+                values = [row[position] if len(row) > position else None for row in rows]
+            else:
+                values = [
+                    next((row[position] for position in reversed(name_positions) if position < len(row)), None)
+                    for row in rows
+                ]
+            columns.append(_object_array(values))
+            present.append(lengths > name_positions[0])
+        return cls(list(positions), columns, present)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def fill_forward(self):
+        """
+        Fills each column's empty cells (None or "") with the last non-empty value above
+        them, skipping rows that don't have the column. Cells with nothing above become None.
+        """
+        for index, column in enumerate(self.columns):
+            if self.present is None:
+                self.columns[index] = _fill_forward(column)
+            else:
+                column[self.present[index]] = _fill_forward(column[self.present[index]])
+
+    def group_runs(self):
+        """
+        Splits the rows into runs of consecutive rows whose first column reads the same,
+        compared as text.
+
+        Returns:
+            list: (start, end) row ranges, end exclusive, in row order.
+        """
+        rows = len(self)
+        if not rows:
+            return []
+        if not self.columns or (self.present is not None and not self.present[0].all()):
+            raise ValueError("Every row needs a first cell to be grouped.")
+
+        keys = _to_str(self.columns[0])
+        bounds = [0, *(np.flatnonzero(keys[1:] != keys[:-1]) + 1).tolist(), rows]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def row(self, index: int):
+        """Returns row `index` as a dict keyed by header."""
+        if self.present is None:
+            return dict(zip(self.headers, (column[index] for column in self.columns)))
+        return {
+            name: column[index]
+            for name, column, present in zip(self.headers, self.columns, self.present) if present[index]
+        }
+
+    def rows(self, start: int = 0, end: int = None):
+        """Returns rows `start` to `end` (exclusive) as dicts keyed by header."""
+        return [self.row(index) for index in range(start, len(self) if end is None else end)]
+
+    def column_values(self):
+        """
+        Returns the headers and value lists of the columns at least one row has, with None
+        where a row lacks the column.
+        """
+        headers, values = [], []
+        for index, (name, column) in enumerate(zip(self.headers, self.columns)):
+            if self.present is None or self.present[index].any():
+                headers.append(name)
+                values.append(column.tolist())
+        return headers, values
+
+    def to_dict(self):
+        return {
+            "headers": self.headers,
+            "columns": [column.tolist() for column in self.columns],
+            "present": [mask.tolist() for mask in self.present] if self.present is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        present = data["present"]
+        return cls(
+            [sys.intern(name) if isinstance(name, str) else name for name in data["headers"]],
+            [_object_array(column) for column in data["columns"]],
+            [np.array(mask, dtype=bool) for mask in present] if present is not None else None,
+        )
@@ -0,0 +1,117 @@
+"""
+Runtime settings for the backend, read from environment variables so deployments
+can tune them without code changes.
+"""
+import os
+
+# Number of worker processes used for page-level table extraction (1 = sequential)
+EXTRACT_WORKERS = int(os.environ.get("ASKHUB_EXTRACT_WORKERS", "1"))
+
+# Skip the table finder on pages whose content draws no lines, rectangles or curves (0 = analyze every page)
+PAGE_PREFILTER = os.environ.get("ASKHUB_PAGE_PREFILTER", "1") != "0"
+
+# Bounded-memory mode: page table models are spilled to disk as they are extracted (into the job's work
+# directory, or a temporary file) and read back as needed, instead of being held for the whole job
+BOUNDED_MEMORY = os.environ.get("ASKHUB_BOUNDED_MEMORY", "0") == "1"
+
+# Resident memory of the server process, in MB, above which a PDF job fails instead of growing further
+# (0 = no limit). It includes the loaded models, so set it below the container limit, not far below.
+MEMORY_BUDGET_MB = float(os.environ.get("ASKHUB_MEMORY_BUDGET_MB", "0"))
+
+# Directory for debug dumps of the intermediate tables and groups (unset = no dumps)
+DEBUG_DUMP_DIR = os.environ.get("ASKHUB_DEBUG_DUMP_DIR") or None
+
+# Concurrent LLM calls used to summarize table groups
+SUMMARY_CONCURRENCY = int(os.environ.get("ASKHUB_SUMMARY_CONCURRENCY", "4"))
+
+# Seconds before a single summary call is abandoned
+SUMMARY_TIMEOUT = float(os.environ.get("ASKHUB_SUMMARY_TIMEOUT", "300"))
+
+# Retries per group after a failed summary call, with exponential backoff from SUMMARY_BACKOFF seconds
+SUMMARY_RETRIES = int(os.environ.get("ASKHUB_SUMMARY_RETRIES", "2"))
+SUMMARY_BACKOFF = float(os.environ.get("ASKHUB_SUMMARY_BACKOFF", "2"))
+
+# Estimated prompt tokens of table content packed into one batched summary call (0 = one call per group).
+# The prompt and all of its paragraphs must fit the model's context window.
+SUMMARY_BATCH_TOKENS = int(os.environ.get("ASKHUB_SUMMARY_BATCH_TOKENS", "0"))
+
+# Ollama server used for summaries, column detection and answers, and checked by /readyz
+OLLAMA_BASE_URL = os.environ.get("ASKHUB_OLLAMA_BASE_URL", "http://localhost:11434")
+
+# LLM gateway shared by every Ollama call (see llm_gateway.py). Requests in flight to Ollama across the
+# process; further calls wait for a free slot, up to their call class's timeout, then fail. Match Ollama's
+# OLLAMA_NUM_PARALLEL, so calls queue here, where queries go first, rather than inside Ollama.
+LLM_MAX_CONCURRENCY = int(os.environ.get("ASKHUB_LLM_MAX_CONCURRENCY", "4"))
+
+# Slots of LLM_MAX_CONCURRENCY that ingestion (column detection, summaries) never takes, so a query finds
+# one free during an upload; ingestion keeps at least one. Queries are capped at
+# LLM_INTERACTIVE_MAX_CONCURRENCY slots (0 = all of them).
+LLM_INTERACTIVE_RESERVED = int(os.environ.get("ASKHUB_LLM_INTERACTIVE_RESERVED", "1"))
+LLM_INTERACTIVE_MAX_CONCURRENCY = int(os.environ.get("ASKHUB_LLM_INTERACTIVE_MAX_CONCURRENCY", "0"))
+
+# Seconds a call may wait for a slot and then for each chunk of the response, by call class: query answers,
+# column detection (summaries use SUMMARY_TIMEOUT). Connecting to Ollama gets LLM_CONNECT_TIMEOUT seconds.
+LLM_QUERY_TIMEOUT = float(os.environ.get("ASKHUB_LLM_QUERY_TIMEOUT", "120"))
+LLM_COLUMN_NAMES_TIMEOUT = float(os.environ.get("ASKHUB_LLM_COLUMN_NAMES_TIMEOUT", "300"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("ASKHUB_LLM_CONNECT_TIMEOUT", "5"))
+
+# Retries of a request that failed to connect or got a 502/503/504, after a random delay of up to
+# LLM_RETRY_BACKOFF seconds, doubling with each retry
+LLM_RETRIES = int(os.environ.get("ASKHUB_LLM_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.environ.get("ASKHUB_LLM_RETRY_BACKOFF", "0.5"))
+
+# Circuit breaker: after this many consecutive failed requests (0 = never), calls fail immediately for
+# LLM_BREAKER_RESET seconds, then a single trial request decides whether Ollama is back
+LLM_BREAKER_FAILURES = int(os.environ.get("ASKHUB_LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.environ.get("ASKHUB_LLM_BREAKER_RESET", "30"))
+
+# Seconds /readyz waits for Ollama to answer before reporting the instance not ready
+READINESS_TIMEOUT = float(os.environ.get("ASKHUB_READINESS_TIMEOUT", "2"))
+
+# SQLite file caching generated group paragraphs across uploads (empty = caching disabled)
+SUMMARY_CACHE_PATH = os.environ.get("ASKHUB_SUMMARY_CACHE_PATH", "summary_cache.sqlite3")
+
+# Maximum cached paragraphs; least recently used entries are evicted beyond this
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get("ASKHUB_SUMMARY_CACHE_MAX_ENTRIES", "200000"))
+
+# Local header scorer: rows scoring at or above ACCEPT that start the table on several pages are headers,
+# rows at or below REJECT are data, and all other rows are sent to the LLM.
+# Set ASKHUB_HEADER_CLASSIFIER=0 to always use the LLM.
+HEADER_CLASSIFIER = os.environ.get("ASKHUB_HEADER_CLASSIFIER", "1") != "0"
+HEADER_ACCEPT_SCORE = float(os.environ.get("ASKHUB_HEADER_ACCEPT_SCORE", "0.75"))
+HEADER_REJECT_SCORE = float(os.environ.get("ASKHUB_HEADER_REJECT_SCORE", "0.35"))
+
+# Paragraphs embedded per batch when adding new summaries to the live index
+INGEST_EMBED_BATCH_SIZE = int(os.environ.get("ASKHUB_INGEST_EMBED_BATCH_SIZE", "64"))
+
+# Ingested documents logged before the full index is re-persisted and the log cleared
+INGEST_COMPACT_RECORDS = int(os.environ.get("ASKHUB_INGEST_COMPACT_RECORDS", "5000"))
+
+# Threads serving /query/ requests, separate from the PDF processing pool
+QUERY_WORKERS = int(os.environ.get("ASKHUB_QUERY_WORKERS", "8"))
+
+# Embedding precision of the memory-mapped vector store written by `numpy_vector_store.py` ("float32" or "float16")
+VECTOR_STORE_DTYPE = os.environ.get("ASKHUB_VECTOR_STORE_DTYPE", "float32")
+
+# Filled tables of processed documents, kept for answering key/column lookups without the LLM
+# (empty = lookups disabled, every question goes through RAG)
+TABLE_STORE_DIR = os.environ.get("ASKHUB_TABLE_STORE_DIR", "table_store")
+
+# Answer cache in front of the query engine (0 entries = disabled). A question whose embedding has at
+# least ANSWER_CACHE_SIMILARITY cosine similarity to a cached one reuses its answer.
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ASKHUB_ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL = float(os.environ.get("ASKHUB_ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ASKHUB_ANSWER_CACHE_SIMILARITY", "0.97"))
+
+# PDF processing jobs run concurrently, and finished jobs kept for status queries
+JOB_WORKERS = int(os.environ.get("ASKHUB_JOB_WORKERS", "2"))
+JOB_HISTORY = int(os.environ.get("ASKHUB_JOB_HISTORY", "100"))
+
+# Largest accepted upload in bytes; uploads are streamed to disk and rejected once they exceed it
+MAX_UPLOAD_BYTES = int(os.environ.get("ASKHUB_MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+# JSON registry of processed documents by content hash, used to skip identical re-uploads
+DOCUMENT_REGISTRY_PATH = os.environ.get("ASKHUB_DOCUMENT_REGISTRY_PATH", "processed_documents.json")
+
+# Per-document work directories holding pipeline checkpoints until the document is fully processed
+WORK_DIR = os.environ.get("ASKHUB_WORK_DIR", "work")
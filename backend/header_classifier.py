@@ -0,0 +1,109 @@
+import re
+
+import config
+
+# Cells that are numbers, dates, phone numbers or codes such as "BS-17" or "A123"
+NUMERIC_CELL = re.compile(r"[\d\s.,:;/()+\-]+")
+ID_CELL = re.compile(r"[A-Za-z]{0,4}[\-/.]?\d+[\w\-/.]*")
+
+
+def _cell_features(cells):
+    """
+    Computes the text-level features of a candidate row.
+
+    Returns:
+        dict: Fractions of non-empty cells that are numeric/ID-like, uppercase labels and
+              multiline, the fraction of empty cells, and the letter share of all alphanumerics.
+    """
+    texts = [cell.strip() for cell in cells if isinstance(cell, str) and cell.strip()]
+    total = len(cells) or 1
+
+    if not texts:
+        return {"numeric": 0.0, "upper": 0.0, "multiline": 0.0, "empty": 1.0, "alpha": 0.0}
+
+    letters = sum(ch.isalpha() for text in texts for ch in text)
+    digits = sum(ch.isdigit() for text in texts for ch in text)
+
+    return {
+        "numeric": sum(bool(NUMERIC_CELL.fullmatch(t) or ID_CELL.fullmatch(t)) for t in texts) / len(texts),
+        "upper": sum(t.isupper() for t in texts) / len(texts),
+        "multiline": sum("\n" in t for t in texts) / len(texts),
+        "empty": 1 - len(texts) / total,
+        "alpha": letters / ((letters + digits) or 1),
+    }
+
+
+def score_header_row(cells, page_count: int):
+    """
+    Scores how likely a row is a column header, from 0 (data) to 1 (header).
+
+    Parameters:
+        cells (list): Cells of the candidate row.
+        page_count (int): Number of pages whose main table starts with this row.
+
+    Returns:
+        float: The header score.
+    """
+    features = _cell_features(cells)
+
+    score = 0.5
+    # Headers repeat at the top of every page of a long table; data rows almost never do
+    score += min(0.3, 0.15 * (page_count - 1))
+    # Serial numbers, phone numbers and codes are data
+    score -= 0.5 * features["numeric"]
+    # Labels are words, values often carry digits
+    score += 0.4 * (features["alpha"] - 0.5)
+    # Government table headers are typically uppercase, often wrapped over several lines
+    score += 0.15 * features["upper"]
+    score += 0.1 * features["multiline"]
+    # Sparse rows are more likely merged-cell data than a header
+    score -= 0.2 * features["empty"]
+
+    return max(0.0, min(1.0, score))
+
+
+def classify_header_candidates(candidates, page_tables):
+    """
+    Classifies candidate header rows as header, data or unsure using a local scorer.
+
+    Only a row that starts the main table on more than one page is accepted as a header
+    without the LLM. A data row in all-caps text can score as high as a real header, and a
+    false header on a continuation page would split the table there; so a single-page row
+    that scores high is left to the LLM ("unsure").
+
+    Parameters:
+        candidates (list): Distinct cleaned first rows, as produced by `extract_headers_txt`.
+        page_tables (list): Per-page table model the candidates were taken from.
+
+    Returns:
+        list: One dict per candidate, in order, with the row, its score, the confidence of
+              the decision (0 to 1) and the decision itself ("header", "data" or "unsure").
+    """
+    page_counts = {}
+    for page_table in page_tables:
+        header = page_table["header"]
+        if header is not None:
+            key = tuple(col.strip() if isinstance(col, str) else col for col in header)
+            page_counts[key] = page_counts.get(key, 0) + 1
+
+    classified = []
+    for row in candidates:
+        page_count = page_counts.get(tuple(row), 1)
+        score = score_header_row(row, page_count)
+
+        if score >= config.HEADER_ACCEPT_SCORE and page_count > 1:
+            decision = "header"
+        elif score <= config.HEADER_REJECT_SCORE:
+            decision = "data"
+        else:
+            decision = "unsure"
+
+        classified.append({
+            "row": row,
+            "score": round(score, 3),
+            # Distance from the undecided midpoint, 0 (coin flip) to 1 (certain)
+            "confidence": round(abs(score - 0.5) * 2, 3),
+            "decision": decision,
+        })
+
+    return classified
@@ -0,0 +1,193 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work when the job has been cancelled."""
+
+
+class Job:
+    """
+    A background ingestion job. The work function receives the job and reports
+    progress through `update()` and calls `raise_if_cancelled()` between units of
+    work (pages, LLM calls) so cancellation stops it promptly.
+    """
+
+    def __init__(self, filename: str, pdf_path: str, document_id: str = None, cancel_token: str = None,
+                 replaces: str = None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.pdf_path = pdf_path
+        self.document_id = document_id
+        # Secret the uploading client chose, so it can cancel the job before it learns the job ID
+        self.cancel_token = cancel_token
+        # Processed document this one is a new version of, as requested by the uploader
+        self.replaces = replaces
+        self.status = "queued"
+        self.step = None
+        self.pages_extracted = 0
+        self.pages_skipped = 0
+        self.pages_total = None
+        self.groups_summarized = 0
+        self.groups_failed = 0
+        self.groups_total = 0
+        self.peak_rss_mb = None
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def cancel(self):
+        """Requests cooperative cancellation; the work stops at its next check."""
+        self._cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            # Never started, so nothing will mark it finished
+            self._finish("cancelled")
+
+    def raise_if_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled.")
+
+    def update(self, **progress):
+        """Sets progress fields, e.g. `update(step="summarizing", groups_total=10)`."""
+        with self._lock:
+            for field, value in progress.items():
+                setattr(self, field, value)
+
+    def increment(self, field: str, amount: int = 1):
+        """Atomically adds to a progress counter; safe from the summarizer's worker threads."""
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def _finish(self, status: str, error: str = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+        if self.pdf_path and os.path.exists(self.pdf_path):
+            os.remove(self.pdf_path)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "filename": self.filename,
+                "document_id": self.document_id,
+                "replaces": self.replaces,
+                "status": self.status,
+                "step": self.step,
+                "pages_extracted": self.pages_extracted,
+                "pages_skipped": self.pages_skipped,
+                "pages_total": self.pages_total,
+                "groups_summarized": self.groups_summarized,
+                "groups_failed": self.groups_failed,
+                "groups_total": self.groups_total,
+                "peak_rss_mb": self.peak_rss_mb,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a bounded worker pool and keeps the most recent finished
+    jobs around for status queries. The job's PDF is deleted once it finishes.
+    """
+
+    def __init__(self, max_workers: int, history: int):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, pdf_path: str, work, document_id: str = None, cancel_token: str = None,
+               replaces: str = None):
+        """
+        Queues `work(pdf_path, job)` as a new job.
+
+        Parameters:
+            filename (str): Client-supplied name of the document.
+            pdf_path (str): Path of the spooled PDF; deleted once the job finishes.
+            work (callable): The processing function.
+            document_id (str): Optional content hash identifying the document.
+            cancel_token (str): Optional token the submitting client can cancel the job with.
+            replaces (str): Optional content hash of a processed document this one replaces.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job(filename, pdf_path, document_id, cancel_token, replaces)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+
+        # Run in a copy of the caller's context, so the job's logs carry the request's trace ID
+        job.future = self._executor.submit(contextvars.copy_context().run, self._run, job, work)
+        return job
+
+    def _run(self, job: Job, work):
+        job.update(status="running", started_at=time.time())
+        try:
+            job.result = work(job.pdf_path, job)
+        except JobCancelled:
+            job._finish("cancelled")
+            print(f"Job {job.id} cancelled")
+        except Exception as e:
+            job._finish("failed", str(e))
+            raise
+        else:
+            job._finish("succeeded")
+        return job.result
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job_for_document(self, document_id: str):
+        """Returns the queued or running job processing the document with this content hash, if any."""
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.finished and job.document_id == document_id:
+                    return job
+        return None
+
+    def counts(self):
+        """Returns the number of tracked jobs per status."""
+        counts = {"queued": 0, "running": 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def active_job_for_cancel_token(self, cancel_token: str):
+        """Returns the queued or running job submitted with this cancel token, if any."""
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.finished and job.cancel_token == cancel_token:
+                    return job
+        return None
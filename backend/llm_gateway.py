@@ -0,0 +1,379 @@
+"""
+Process-wide gateway for every call to Ollama: column detection and summaries in the
+ingestion pipeline, and the query engine's answers.
+
+All of the gateway's clients send through one HTTP connection pool, so connections are
+kept alive and reused across calls and callers. Each request also passes through the
+gateway's checks: a priority scheduler that bounds the requests in flight and lets
+interactive queries go ahead of ingestion, the timeout of its call class, retries for
+requests that never reached the model, and a circuit breaker that stops calling Ollama
+for a while once it keeps failing.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+
+import config
+from metrics import (LLM_QUEUE_WAIT_SECONDS, LLM_REQUESTS, LLM_RETRIES, Gauge, langchain_callbacks, log_event,
+                     register_llama_index_handler)
+
+MODEL = "llama3"
+
+# Seconds an idle connection is kept open for the next call
+KEEPALIVE_EXPIRY = 60
+
+# Responses from an Ollama (or a proxy in front of it) that is restarting or overloaded
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# Priority of each call class: a user waiting on an answer, or bulk document processing
+CALL_PRIORITIES = {"query": "interactive", "column_names": "ingestion", "summarize": "ingestion"}
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised instead of calling Ollama while the circuit is open, or when no call slot frees up in time."""
+
+
+def call_timeout(call_class: str):
+    """
+    Seconds a call of `call_class` ("query", "column_names" or "summarize") may wait for a
+    call slot, and then for each chunk of the response.
+    """
+    return {
+        "query": config.LLM_QUERY_TIMEOUT,
+        "column_names": config.LLM_COLUMN_NAMES_TIMEOUT,
+        "summarize": config.SUMMARY_TIMEOUT,
+    }[call_class]
+
+
+class PriorityScheduler:
+    """
+    Hands out call slots by priority. A free slot goes to the longest-waiting call of the
+    highest priority class that is under its cap, so a query never queues behind ingestion
+    calls that haven't started yet. Running calls are never interrupted; instead, slots
+    left out of the ingestion cap stay free for interactive calls even while an upload
+    keeps every other slot busy.
+
+    Parameters:
+        capacity (int): Calls in flight across all priority classes.
+        caps (dict): Calls in flight per priority class, keyed by class, highest priority first.
+    """
+
+    def __init__(self, capacity: int, caps: dict):
+        self.capacity = capacity
+        self.caps = {priority: max(1, min(cap, capacity)) for priority, cap in caps.items()}
+        self.in_flight = {priority: 0 for priority in caps}
+        self._waiting = {priority: deque() for priority in caps}
+        self._condition = threading.Condition()
+
+    def queued(self):
+        """Returns the calls waiting for a slot per priority class."""
+        with self._condition:
+            return {priority: len(waiting) for priority, waiting in self._waiting.items()}
+
+    def _can_start(self, priority: str, ticket):
+        if sum(self.in_flight.values()) >= self.capacity or self.in_flight[priority] >= self.caps[priority]:
+            return False
+        if self._waiting[priority][0] is not ticket:
+            return False
+
+        # A waiting call of a higher class that is under its cap takes the slot first
+        for other in self.caps:
+            if other == priority:
+                return True
+            if self._waiting[other] and self.in_flight[other] < self.caps[other]:
+                return False
+        return True
+
+    def acquire(self, priority: str, timeout: float):
+        """Waits up to `timeout` seconds for a slot of `priority`. Returns whether one was taken."""
+        ticket = object()
+        started = time.perf_counter()
+        with self._condition:
+            self._waiting[priority].append(ticket)
+            try:
+                taken = self._condition.wait_for(lambda: self._can_start(priority, ticket), timeout)
+                if taken:
+                    self.in_flight[priority] += 1
+            finally:
+                self._waiting[priority].remove(ticket)
+                # The next call in line may be able to start now
+                self._condition.notify_all()
+
+        LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, priority=priority)
+        return taken
+
+    def release(self, priority: str):
+        with self._condition:
+            self.in_flight[priority] -= 1
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failed requests (0 = never) and rejects requests for
+    `reset_seconds`. Then a single trial request is let through: its success closes the
+    circuit, its failure opens it again.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns whether a request may be sent now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                log_event("llm_circuit", state="closed")
+            self.state = "closed"
+            self._consecutive = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or (self.state == "closed" and 0 < self.failures <= self._consecutive):
+                log_event("llm_circuit", state="open", consecutive_failures=self._consecutive)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class _TrackedStream(httpx.SyncByteStream):
+    """Response body that reports the request finished, with any error reading it, once closed."""
+
+    def __init__(self, stream, finish):
+        self._stream = stream
+        self._finish = finish
+        self._error = None
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                yield chunk
+        except httpx.TransportError as e:
+            self._error = e
+            raise
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            finish, self._finish = self._finish, None
+            if finish is not None:
+                finish(self._error)
+
+
+class _CallerTransport(httpx.BaseTransport):
+    """Transport of one caller's Ollama clients; requests go through the gateway, which owns the connections."""
+
+    def __init__(self, gateway, caller: str, priority: str, timeout: httpx.Timeout):
+        self.gateway = gateway
+        self.caller = caller
+        self.priority = priority
+        self.timeout = timeout
+
+    def handle_request(self, request):
+        return self.gateway.send(request, self.caller, self.priority, self.timeout)
+
+    def close(self):
+        # The shared connection pool outlives any one client
+        pass
+
+
+def _failure_outcome(error):
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.ConnectError):
+        return "connect_error"
+    return "error"
+
+
+class LLMGateway:
+    """
+    Hands out shared Ollama clients (langchain chat models and llama-index LLMs) whose
+    requests all go through `send()`.
+
+    Parameters:
+        scheduler (PriorityScheduler): Hands out the slots of requests in flight; its capacity
+                                       is also the number of connections kept alive.
+        retries (int): Retries of a request that failed to connect or got a 502/503/504.
+        backoff (float): Upper bound of the random delay before the first retry; doubles per retry.
+        breaker (CircuitBreaker): Breaker shared by every request.
+    """
+
+    def __init__(self, scheduler: PriorityScheduler, retries: int, backoff: float, breaker: CircuitBreaker):
+        self.scheduler = scheduler
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker
+        self._pool = httpx.HTTPTransport(limits=httpx.Limits(
+            max_connections=scheduler.capacity, max_keepalive_connections=scheduler.capacity,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ))
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _timeout(self, seconds: float):
+        return httpx.Timeout(seconds, connect=min(seconds, config.LLM_CONNECT_TIMEOUT))
+
+    def _acquire(self, caller: str, priority: str, timeout: httpx.Timeout):
+        if not self.scheduler.acquire(priority, timeout.read):
+            LLM_REQUESTS.inc(caller=caller, outcome="busy")
+            raise LLMUnavailable(f"No LLM call slot freed up within {timeout.read:.0f}s.")
+        # Checked once the slot is held: a trial request let through a half-open circuit is
+        # always sent, so its outcome closes or reopens the circuit
+        if not self.breaker.allow():
+            self.scheduler.release(priority)
+            LLM_REQUESTS.inc(caller=caller, outcome="circuit_open")
+            raise LLMUnavailable("Ollama keeps failing; LLM calls are paused until it recovers.")
+
+    def _release(self, caller: str, priority: str, outcome: str):
+        self.scheduler.release(priority)
+
+        LLM_REQUESTS.inc(caller=caller, outcome=outcome)
+        if outcome in ("ok", "client_error"):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def send(self, request: httpx.Request, caller: str, priority: str, timeout: httpx.Timeout):
+        """
+        Sends `request` for `caller` with `timeout`, holding a slot of `priority` until its response
+        is closed. Requests that fail to connect or get a 502/503/504 are retried after a
+        jittered exponential backoff.
+
+        Raises:
+            LLMUnavailable: The circuit is open, or no slot freed up within the timeout.
+        """
+        request.extensions["timeout"] = timeout.as_dict()
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            self._acquire(caller, priority, timeout)
+            try:
+                response = self._pool.handle_request(request)
+            except httpx.TransportError as e:
+                self._release(caller, priority, _failure_outcome(e))
+                # Only a request that never reached Ollama is safe to send again
+                if last_attempt or not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                    raise
+            except BaseException:
+                self._release(caller, priority, "error")
+                raise
+            else:
+                if last_attempt or response.status_code not in RETRY_STATUS_CODES:
+                    status = response.status_code
+                    outcome = "ok" if status < 400 else "client_error" if status < 500 else "error"
+                    response.stream = _TrackedStream(
+                        response.stream,
+                        lambda error: self._release(caller, priority, _failure_outcome(error) if error else outcome),
+                    )
+                    return response
+
+                response.close()
+                self._release(caller, priority, "error")
+
+            LLM_RETRIES.inc(caller=caller)
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def transport(self, caller: str, call_class: str, seconds: float):
+        """
+        Returns an httpx transport sending `caller`'s requests through the gateway, at the
+        priority of `call_class` and with a `seconds` timeout.
+        """
+        return _CallerTransport(self, caller, CALL_PRIORITIES[call_class], self._timeout(seconds))
+
+    def chat_model(self, caller: str, call_class: str = None, timeout: float = None):
+        """
+        Returns the shared langchain chat model for `caller`, recording its latency and
+        token metrics under that name.
+
+        Parameters:
+            caller (str): Name the calls are counted under.
+            call_class (str): Call class whose timeout applies; defaults to `caller`.
+            timeout (float): Seconds overriding the call class's timeout.
+        """
+        from langchain_ollama import ChatOllama
+
+        call_class = call_class or caller
+        seconds = timeout or call_timeout(call_class)
+        with self._lock:
+            key = ("langchain", caller, seconds)
+            if key not in self._clients:
+                self._clients[key] = ChatOllama(
+                    model=MODEL,
+                    base_url=config.OLLAMA_BASE_URL,
+                    temperature=0,
+                    client_kwargs={"transport": self.transport(caller, call_class, seconds)},
+                    callbacks=langchain_callbacks(caller, MODEL),
+                )
+            return self._clients[key]
+
+    def llama_index_llm(self, caller: str, call_class: str = None):
+        """Returns the shared llama-index LLM for `caller`, recording its latency and token metrics under that name."""
+        from llama_index.llms.ollama import Ollama
+        from ollama import Client
+
+        call_class = call_class or caller
+        seconds = call_timeout(call_class)
+        with self._lock:
+            key = ("llama_index", caller, seconds)
+            if key not in self._clients:
+                self._clients[key] = Ollama(
+                    model=MODEL,
+                    base_url=config.OLLAMA_BASE_URL,
+                    request_timeout=seconds,
+                    temperature=0,
+                    client=Client(host=config.OLLAMA_BASE_URL, transport=self.transport(caller, call_class, seconds)),
+                )
+                register_llama_index_handler(caller, MODEL)
+            return self._clients[key]
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Returns the process-wide gateway, created from the config on first use."""
+    global _gateway
+
+    with _gateway_lock:
+        if _gateway is None:
+            capacity = config.LLM_MAX_CONCURRENCY
+            scheduler = PriorityScheduler(capacity, {
+                "interactive": config.LLM_INTERACTIVE_MAX_CONCURRENCY or capacity,
+                "ingestion": capacity - config.LLM_INTERACTIVE_RESERVED,
+            })
+            _gateway = LLMGateway(
+                scheduler,
+                config.LLM_RETRIES,
+                config.LLM_RETRY_BACKOFF,
+                CircuitBreaker(config.LLM_BREAKER_FAILURES, config.LLM_BREAKER_RESET),
+            )
+        return _gateway
+
+
+# Read at scrape time
+Gauge("askhub_llm_in_flight", "Requests to Ollama in flight through the LLM gateway, by priority class.", ["priority"],
+      function=lambda: {(priority,): count for priority, count in _gateway.scheduler.in_flight.items()}
+      if _gateway is not None else {})
+Gauge("askhub_llm_queued", "LLM calls waiting for a gateway slot, by priority class.", ["priority"],
+      function=lambda: {(priority,): count for priority, count in _gateway.scheduler.queued().items()}
+      if _gateway is not None else {})
+Gauge("askhub_llm_circuit_open", "1 while the LLM gateway's circuit breaker rejects calls (open or half-open), else 0.",
+      function=lambda: int(_gateway is not None and _gateway.breaker.state != "closed"))
@@ -1,23 +1,112 @@
-from fastapi import FastAPI, UploadFile, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, UploadFile, HTTPException, Request, BackgroundTasks, Form
 from pydantic import BaseModel
+from typing import Optional
 import os
-from tempfile import NamedTemporaryFile
+import shutil
 from table_processing import process_pdf_to_paragraph
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
+import contextvars
+import threading
+import time
+from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
-from pydantic import BaseModel
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
-from RAG import query_engine
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import httpx
+from RAG import answer_cache, ingest_paragraph_files, query_index, readiness, stream_query_index, warm_up
+from jobs import JobManager
+from uploads import DocumentRegistry, UploadTooLarge, spool_upload
+from checkpoint import PipelineCheckpoint
+from llm_gateway import LLMUnavailable, get_gateway
+from table_store import get_table_store
+from metrics import HTTP_REQUEST_SECONDS, REGISTRY, Gauge, new_trace_id, trace_id
+import orjson
+import config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedder and index in the background so the server accepts connections right away;
+    # /readyz reports when it's done
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+# PDF processing runs as jobs on a bounded worker pool
+jobs = JobManager(max_workers=config.JOB_WORKERS, history=config.JOB_HISTORY)
+# Summary paragraphs of processed documents, one folder per document
+SUMMARIES_DIR = "Tables"
+# Processed documents by content hash, so identical re-uploads return immediately
+document_registry = DocumentRegistry(config.DOCUMENT_REGISTRY_PATH)
+# Queries get their own pool so they never wait behind PDF processing
+query_executor = ThreadPoolExecutor(max_workers=config.QUERY_WORKERS, thread_name_prefix="query")
+
+# Read at scrape time
+Gauge("askhub_query_queue_depth", "Queries waiting for a free query worker.",
+      function=lambda: query_executor._work_queue.qsize())
+Gauge("askhub_jobs", "Tracked ingestion jobs by status.", ["status"],
+      function=lambda: {(status,): count for status, count in jobs.counts().items()})
 
 
-app = FastAPI()
-executor = ThreadPoolExecutor()
-ongoing_tasks = {}  # Dictionary to track ongoing tasks and their temp files
+def run_in_query_pool(func, *args, context: contextvars.Context = None):
+    """Runs `func` in the query pool, in the caller's context so its logs keep the request's trace ID."""
+    context = context or contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(query_executor, context.run, func, *args)
+
+
+def process_and_index_pdf(pdf_path: str, job=None):
+    """
+    Runs the table pipeline on a PDF, adds the new paragraphs to the live index and stores
+    the filled tables for direct lookups. Jobs for a known document checkpoint into a
+    per-document work directory, so a failed, cancelled or interrupted run of the same
+    document resumes where it stopped.
+
+    A job that replaces an earlier processed document removes that document's paragraphs
+    from the index once its own are in. Documents are never replaced by file name alone.
+    """
+    document_id = job.document_id if job is not None and job.document_id else os.path.basename(pdf_path)
+    filename = job.filename if job is not None else document_id
+    replaces = [job.replaces] if job is not None and job.replaces else []
+    checkpoint = None
+    output_folder = SUMMARIES_DIR
+    if job is not None and job.document_id:
+        checkpoint = PipelineCheckpoint(os.path.join(config.WORK_DIR, job.document_id))
+        # Paragraph file names repeat across documents, so each document gets its own folder;
+        # a resumed run rewrites the paragraphs it restores from the checkpoint
+        output_folder = os.path.join(SUMMARIES_DIR, job.document_id)
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    table_store = get_table_store()
+    tables = []
+
+    summary_files = process_pdf_to_paragraph(
+        pdf_path, job=job, work_dir=checkpoint and checkpoint.work_dir,
+        table_sink=tables.append if table_store is not None else None, output_folder=output_folder,
+    )
+
+    if job is not None:
+        job.raise_if_cancelled()
+        job.update(step="indexing")
+    ingest_paragraph_files(summary_files, document_id, replaces=replaces)
+
+    if table_store is not None:
+        table_store.add_document(document_id, filename, tables, replaces=replaces)
+
+    if job is not None and job.document_id:
+        for replaced in document_registry.record(job.document_id, job.filename, output_folder, summary_files,
+                                                 replaces=replaces):
+            if replaced.get("output_folder"):
+                shutil.rmtree(replaced["output_folder"], ignore_errors=True)
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    return summary_files
+
 
 class CancellationRequest(BaseModel):
-    filename: str
+    job_id: Optional[str] = None
+    cancel_token: Optional[str] = None
 class UserInputRequest(BaseModel):
     user_input: str
 
@@ -30,102 +119,284 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/process-pdf/")
-async def process_pdf_endpoint(file: UploadFile, request: Request):
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Tags the request with a trace ID (the client's X-Request-ID, or a new one) that the
+    structured logs of its query or job carry, echoes it in the response, and records the
+    request's latency. For streamed responses the latency is the time to the first byte.
     """
-    Endpoint to process a PDF and generate summaries.
+    trace_id.set(request.headers.get("x-request-id") or new_trace_id())
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = trace_id.get()
+        return response
+    finally:
+        # Label by route template, not the raw path, so job IDs don't each get their own series
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     path=route.path if route is not None else "unmatched", status=status)
+
+
+async def submit_pdf_job(file: UploadFile, replaces: str = None, cancel_token: str = None):
+    """
+    Validates an uploaded PDF, streams it to a temporary file and queues a processing job for it.
+    With `replaces`, the document is a new version of that processed document, whose paragraphs,
+    tables and registry entry it replaces. A job this call creates can be cancelled with `cancel_token`.
+
+    Returns:
+        tuple: The job (None if the document was already processed), the registry entry of
+               an earlier identical upload (None otherwise) and whether this call created the
+               job. An identical document that is still being processed returns its running
+               job, which belongs to the request that created it.
     """
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
-
-    temp_pdf_path = None
+    if replaces and not document_registry.contains(replaces):
+        raise HTTPException(status_code=404, detail="Document to replace not found.")
 
     try:
-        with NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-            temp_pdf_path = temp_pdf.name
-            temp_pdf.write(await file.read())
-
-        # Store the temp file path with the filename
-        ongoing_tasks[file.filename] = {
-            "path": temp_pdf_path,
-            "task": None
-        }
-
-        disconnect_event = asyncio.Event()
-
-        async def monitor_connection():
-            while not disconnect_event.is_set():
-                if await request.is_disconnected():
-                    disconnect_event.set()
-                    # Clean up if client disconnects
-                    await cleanup_task(file.filename)
-                    return
-                await asyncio.sleep(0.1)
-
-        monitor_task = asyncio.create_task(monitor_connection())
-        loop = asyncio.get_event_loop()
-
-        processing_task = loop.run_in_executor(
-            executor, process_pdf_to_paragraph, temp_pdf_path
-        )
-        
-        ongoing_tasks[file.filename]["task"] = processing_task
+        temp_pdf_path, sha256, _ = await spool_upload(file, config.MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-        try:
-            done, pending = await asyncio.wait(
-                [processing_task, monitor_task],
-                return_when=asyncio.FIRST_COMPLETED
-            )
-            
-            for task in pending:
-                task.cancel()
+    processed = document_registry.get(sha256)
+    existing_job = jobs.active_job_for_document(sha256) if processed is None else None
+    if processed is not None or existing_job is not None:
+        os.remove(temp_pdf_path)
+        return existing_job, processed, False
+
+    job = jobs.submit(file.filename, temp_pdf_path, process_and_index_pdf, document_id=sha256,
+                      cancel_token=cancel_token, replaces=replaces)
+    return job, None, True
+
+
+@app.post("/jobs/", status_code=202)
+async def create_job(file: UploadFile, replaces: Optional[str] = Form(None)):
+    """
+    Queues a PDF for processing and returns immediately with the job ID to poll.
+    An identical document that was already processed returns its earlier result instead.
+    The optional `replaces` form field names the processed document (by its SHA-256) that
+    this upload is a new version of.
+    """
+    job, processed, _ = await submit_pdf_job(file, replaces)
+    if processed is not None:
+        return JSONResponse(status_code=200, content={"job_id": None, "status": "succeeded", "duplicate": True,
+                                                      "document": processed})
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Reports a job's status, current step, and page and group progress."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancels a job; it stops at the next page or LLM call."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    job.cancel()
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/retry", status_code=202)
+async def retry_job(job_id: str):
+    """
+    Reruns a failed or cancelled job from its last checkpoint. The uploaded PDF is not kept,
+    so a job that stopped before its page tables were checkpointed must be re-uploaded instead.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.status not in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}; only failed or cancelled jobs can be retried.")
 
-            if disconnect_event.is_set():
-                raise HTTPException(status_code=499, detail="Client closed request")
+    checkpoint_dir = os.path.join(config.WORK_DIR, job.document_id or "")
+    if not job.document_id or not PipelineCheckpoint(checkpoint_dir).has("page_tables"):
+        raise HTTPException(status_code=409, detail="No checkpoint to resume from; upload the PDF again.")
 
-            await processing_task
-            return {"message": "PDF processed successfully."}
+    existing_job = jobs.active_job_for_document(job.document_id)
+    if existing_job is not None:
+        return {"job_id": existing_job.id, "status": existing_job.status}
 
-        except asyncio.CancelledError:
+    retried = jobs.submit(job.filename, None, process_and_index_pdf, document_id=job.document_id,
+                          replaces=job.replaces)
+    return {"job_id": retried.id, "status": retried.status}
+
+
+@app.post("/process-pdf/")
+async def process_pdf_endpoint(file: UploadFile, request: Request, replaces: Optional[str] = Form(None),
+                               cancel_token: Optional[str] = Form(None)):
+    """
+    Endpoint to process a PDF and generate summaries. Holds the request open until
+    the job finishes and cancels the job if the client disconnects. A request for a
+    document that another request or `/jobs/` is already processing waits on that job,
+    and only stops waiting if its client disconnects. `replaces` is as in `/jobs/`;
+    the optional `cancel_token`, a secret the client picks per upload, lets it cancel the
+    job through `/cancel-processing/` before the job ID is returned.
+    """
+    job, processed, created = await submit_pdf_job(file, replaces, cancel_token)
+    if processed is not None:
+        return {"message": "PDF already processed.", "duplicate": True}
+
+    disconnect_event = asyncio.Event()
+
+    def cancel_own_job():
+        if created:
+            job.cancel()
+
+    async def monitor_connection():
+        while not disconnect_event.is_set():
+            if await request.is_disconnected():
+                disconnect_event.set()
+                # Stop the work if the client disconnects
+                cancel_own_job()
+                return
+            await asyncio.sleep(0.1)
+
+    monitor_task = asyncio.create_task(monitor_connection())
+    # Shielded: cancelling this request must not cancel the job's future, which may be another request's
+    processing_task = asyncio.shield(asyncio.wrap_future(job.future))
+
+    try:
+        await asyncio.wait(
+            [processing_task, monitor_task],
+            return_when=asyncio.FIRST_COMPLETED
+        )
+
+        if disconnect_event.is_set():
             raise HTTPException(status_code=499, detail="Client closed request")
-        finally:
-            monitor_task.cancel()
-            await cleanup_task(file.filename)
 
+        await processing_task
+        if job.status == "cancelled":
+            raise HTTPException(status_code=499, detail="Processing was cancelled")
+        return {"message": "PDF processed successfully.", "job_id": job.id}
+
+    except asyncio.CancelledError:
+        cancel_own_job()
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except HTTPException:
+        raise
     except Exception as e:
-        if temp_pdf_path and os.path.exists(temp_pdf_path):
-            os.remove(temp_pdf_path)
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    finally:
+        monitor_task.cancel()
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the server is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: the index is loaded, the embedder warmed and Ollama reachable.
+    Returns 503 until all three hold, so load balancers only route to warm instances.
+    """
+    checks = readiness()
+    checks["ollama_reachable"], checks["ollama_error"] = True, None
+    checks["llm_circuit"] = get_gateway().breaker.state
+
+    try:
+        async with httpx.AsyncClient(timeout=config.READINESS_TIMEOUT) as client:
+            response = await client.get(f"{config.OLLAMA_BASE_URL}/api/tags")
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        checks["ollama_reachable"], checks["ollama_error"] = False, str(e) or type(e).__name__
+
+    ready = checks["index_loaded"] and checks["ollama_reachable"]
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, **checks})
 
 
 @app.post("/query/")
 async def query(request: UserInputRequest):
     user_input = request.user_input
 
-    # Perform the query
-    window_response = query_engine.query(user_input)
-
-    # Convert the response to a JSON-compatible format
-    result_dict = jsonable_encoder(window_response)
+    # Perform the query off the event loop
+    try:
+        answer = await run_in_query_pool(query_index, user_input)
+    except LLMUnavailable as e:
+        # Fail fast while Ollama is down or saturated instead of holding the request open
+        raise HTTPException(status_code=503, detail=str(e))
 
     # Return the response content
-    return JSONResponse(content={"answer": result_dict.get('response', '')})
+    return JSONResponse(content={"answer": answer})
+
+
+@app.post("/query/stream/")
+async def query_stream(request: UserInputRequest):
+    """
+    Streams the answer as server-sent events: one `data: {"token": ...}` event per
+    text chunk, then an `end` event (or an `error` event if generation fails).
+    """
+    context = contextvars.copy_context()
+    try:
+        token_gen = await run_in_query_pool(stream_query_index, request.user_input, context=context)
+        # Pull the first token before responding: the LLM call starts lazily, and once the
+        # stream has begun an unavailable LLM can only be reported as an `error` event
+        token = await run_in_query_pool(next, token_gen, None, context=context)
+    except LLMUnavailable as e:
+        # Fail fast while Ollama is down or saturated, as /query/ does
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events(token):
+        try:
+            while token is not None:
+                yield b"data: " + orjson.dumps({"token": token}) + b"\n\n"
+                # Pull each token in the pool; the generator blocks on the LLM
+                token = await run_in_query_pool(next, token_gen, None, context=context)
+            yield b"event: end\ndata: {}\n\n"
+        except Exception as e:
+            yield b"event: error\ndata: " + orjson.dumps({"detail": str(e)}) + b"\n\n"
+
+    return StreamingResponse(events(token), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/query/cache-stats/")
+async def query_cache_stats():
+    """Returns the answer cache's size, hit counters and hit rates."""
+    return answer_cache.stats()
+
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: pipeline stage and LLM call latencies, token counts, query stage
+    latencies and routes, HTTP latencies, query queue depth and ingestion jobs.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-async def cleanup_task(filename: str):
-    """Helper function to clean up task and temporary files"""
-    if filename in ongoing_tasks:
-        task_info = ongoing_tasks[filename]
-        if task_info["task"]:
-            task_info["task"].cancel()
-        if task_info["path"] and os.path.exists(task_info["path"]):
-            os.remove(task_info["path"])
-        ongoing_tasks.pop(filename)
 
 @app.post("/cancel-processing/")
 async def cancel_processing(request: CancellationRequest):
-    """Endpoint to cancel ongoing PDF processing."""
-    if request.filename in ongoing_tasks:
-        await cleanup_task(request.filename)
-        return {"message": "Processing canceled successfully."}
+    """
+    Endpoint to cancel ongoing PDF processing: the job with `job_id`, or the job uploaded
+    to `/process-pdf/` with `cancel_token`. File names are never matched, since unrelated
+    uploads can share one.
+    """
+    if request.job_id:
+        job = jobs.get(request.job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        job = job if not job.finished else None
+    elif request.cancel_token:
+        job = jobs.active_job_for_cancel_token(request.cancel_token)
+    else:
+        raise HTTPException(status_code=422, detail="Give the job_id or the cancel_token of the processing to cancel.")
+
+    if job is not None:
+        job.cancel()
+        return {"message": "Processing canceled successfully.", "job_id": job.id}
     return {"message": "No ongoing processing found for this file."}
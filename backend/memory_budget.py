@@ -0,0 +1,49 @@
+"""
+Resident memory tracking for PDF processing jobs: the peak seen while a job runs, and an
+optional budget that fails the job before the container's memory limit kills the server.
+"""
+import os
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised when the server's resident memory grows past the configured budget."""
+
+
+def current_rss():
+    """Returns this process's resident set size in bytes, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class MemoryBudget:
+    """
+    Samples the process's resident memory at each `check()`, keeping the peak, and raises
+    `MemoryBudgetExceeded` once it is above `limit_mb` (0 = no limit).
+
+    The budget covers the whole server process, including the loaded models and any other
+    job running at the same time; spawned extraction workers are not counted.
+    """
+
+    def __init__(self, limit_mb: float = 0):
+        self.limit = limit_mb * 1024 * 1024 if limit_mb > 0 else None
+        self.peak = current_rss()
+
+    def check(self):
+        rss = current_rss()
+        if rss is None:
+            return
+
+        if self.peak is None or rss > self.peak:
+            self.peak = rss
+        if self.limit is not None and rss > self.limit:
+            raise MemoryBudgetExceeded(
+                f"Resident memory {rss / 2**20:.0f} MB is over the {self.limit / 2**20:.0f} MB budget."
+            )
+
+    @property
+    def peak_mb(self):
+        """Peak resident memory seen so far in MB, or None if it can't be measured."""
+        return round(self.peak / 2**20, 1) if self.peak is not None else None
@@ -0,0 +1,350 @@
+import contextvars
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import orjson
+
+# Trace ID of the request being served; copied into job and worker threads with the context
+trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def log_event(event: str, **fields):
+    """Prints one structured JSON log line, tagged with the current trace ID if there is one."""
+    record = {"event": event, "trace_id": trace_id.get(), **fields}
+    print(orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS).decode("utf-8"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Collects metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. calls or tokens."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. With `function`, the value is read at scrape time: the
+    function returns a number, or a dict of label-value tuples to numbers.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None, registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is not None:
+            values = self.function()
+            values = values if isinstance(values, dict) else {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over cumulative buckets, with their sum and count."""
+
+    type = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[position] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the `with` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            labels = self._labels(key)
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {counts[-1]}")
+        return lines
+
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "askhub_pipeline_stage_seconds", "Time spent in each stage of the PDF pipeline, per document.", ["stage"]
+)
+PIPELINE_SECONDS = Histogram("askhub_pipeline_seconds", "End-to-end PDF pipeline time per document.", ["outcome"])
+PIPELINE_PAGES = Counter(
+    "askhub_pipeline_pages_total", "Pages by whether the table finder analyzed them or the pre-filter skipped them.",
+    ["result"],
+)
+PREFILTER_SAVED_SECONDS = Counter(
+    "askhub_pipeline_prefilter_saved_seconds_total",
+    "Estimated table finder time saved by the page pre-filter (skipped pages x mean time per analyzed page).",
+)
+LLM_CALL_SECONDS = Histogram("askhub_llm_call_seconds", "Latency of a single LLM call.", ["caller", "model"])
+LLM_CALLS = Counter("askhub_llm_calls_total", "LLM calls by caller and outcome.", ["caller", "outcome"])
+LLM_TOKENS = Counter("askhub_llm_tokens_total", "Prompt and completion tokens reported by Ollama.", ["caller", "kind"])
+LLM_REQUESTS = Counter(
+    "askhub_llm_requests_total", "HTTP requests to Ollama through the LLM gateway by caller and outcome.",
+    ["caller", "outcome"],
+)
+LLM_RETRIES = Counter("askhub_llm_retries_total", "Requests the LLM gateway retried, by caller.", ["caller"])
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "askhub_llm_queue_wait_seconds", "Time LLM calls waited for a gateway slot, by priority class.", ["priority"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+QUERY_STAGE_SECONDS = Histogram(
+    "askhub_query_stage_seconds", "Time spent in each stage of answering a query.", ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+QUERIES = Counter("askhub_queries_total", "Answered queries by the route that answered them.", ["route"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "askhub_http_request_seconds", "HTTP request latency.", ["method", "path", "status"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+
+# Per-thread stack of the child time of the stage timers currently running
+_stage_stack = threading.local()
+
+
+class StageTimings:
+    """
+    Measures the exclusive time of nested and streamed stages.
+
+    Stages may run inside one another, e.g. a generator stage pulling from the stage before
+    it. Time spent in an inner stage is subtracted from the outer one, so each stage's time
+    is its own work only. `finish()` records the totals in `histogram`.
+    """
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Times the `with` block as `stage`."""
+        stack = _stage_stack.__dict__.setdefault("children", [])
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            child = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed - child
+
+    def iter(self, stage: str, iterable):
+        """Yields from `iterable`, timing the work of producing each item as `stage`."""
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            with self.stage(stage):
+                item = next(iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def finish(self):
+        """Records every stage's total and returns them in seconds, rounded for logging."""
+        for stage, seconds in self.seconds.items():
+            self.histogram.observe(seconds, stage=stage)
+        return {stage: round(seconds, 4) for stage, seconds in self.seconds.items()}
+
+
+def record_llm_call(caller: str, model: str, seconds: float, prompt_tokens=None, completion_tokens=None,
+                    error: bool = False):
+    """Records one LLM call's latency, outcome and the token counts Ollama reported."""
+    LLM_CALL_SECONDS.observe(seconds, caller=caller, model=model)
+    LLM_CALLS.inc(caller=caller, outcome="error" if error else "ok")
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, caller=caller, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, caller=caller, kind="completion")
+
+
+_langchain_handler_class = None
+
+
+def langchain_callbacks(caller: str, model: str):
+    """
+    Returns langchain callbacks recording each call's latency and Ollama's token counts
+    (`prompt_eval_count`, `eval_count`) under `caller`. Pass them as the chat model's
+    `callbacks`.
+    """
+    global _langchain_handler_class
+
+    if _langchain_handler_class is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMMetricsHandler(BaseCallbackHandler):
+            def __init__(self, caller, model):
+                self.caller = caller
+                self.model = model
+                self._started = {}
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+                self._started[run_id] = time.perf_counter()
+
+            def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+                self._started[run_id] = time.perf_counter()
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                info = {}
+                for generations in response.generations:
+                    for generation in generations:
+                        info = generation.generation_info or info
+                seconds = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+                record_llm_call(self.caller, self.model, seconds,
+                                info.get("prompt_eval_count"), info.get("eval_count"))
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                seconds = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+                record_llm_call(self.caller, self.model, seconds, error=True)
+
+        _langchain_handler_class = LLMMetricsHandler
+
+    return [_langchain_handler_class(caller, model)]
+
+
+_llama_index_handler_registered = False
+
+
+def register_llama_index_handler(caller: str, model: str):
+    """
+    Records every llama-index LLM call (the query engine's answers) under `caller`,
+    through the llama-index instrumentation dispatcher. Safe to call more than once.
+    """
+    global _llama_index_handler_registered
+
+    if _llama_index_handler_registered:
+        return
+
+    from llama_index.core.instrumentation import get_dispatcher
+    from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+    from llama_index.core.instrumentation.events.llm import (
+        LLMChatEndEvent, LLMChatStartEvent, LLMCompletionEndEvent, LLMCompletionStartEvent,
+    )
+
+    started = {}
+
+    class LLMMetricsEventHandler(BaseEventHandler):
+        @classmethod
+        def class_name(cls):
+            return "LLMMetricsEventHandler"
+
+        def handle(self, event, **kwargs):
+            if isinstance(event, (LLMChatStartEvent, LLMCompletionStartEvent)):
+                started[event.span_id] = time.perf_counter()
+            elif isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+                seconds = time.perf_counter() - started.pop(event.span_id, time.perf_counter())
+                raw = (event.response.raw if event.response is not None else None) or {}
+                record_llm_call(caller, model, seconds, raw.get("prompt_eval_count"), raw.get("eval_count"))
+
+    get_dispatcher().add_event_handler(LLMMetricsEventHandler())
+    _llama_index_handler_registered = True
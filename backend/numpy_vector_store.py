@@ -0,0 +1,305 @@
+import argparse
+import os
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+import orjson
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+import config
+
+# Files of a persisted store, all inside the index's persist directory
+VECTORS_FILE = "vectors.npy"
+NODES_FILE = "vector_nodes.jsonl"
+OFFSETS_FILE = "vector_offsets.npy"
+IDS_FILE = "vector_ids.json"
+
+# Rows scored per matmul, so float16 stores are upcast a slice at a time
+SCORE_CHUNK_ROWS = 65536
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store keeping unit-normalized embeddings in one contiguous `.npy` matrix that
+    is memory-mapped on load, so opening an index costs neither parsing nor RAM per node.
+
+    Node IDs and document IDs live in a small JSON side table; each node's content is a
+    line of a JSONL file, read by byte offset only when the node is retrieved. Rows added
+    after loading are kept in memory and rows deleted are masked out until the next
+    `persist()`, which rewrites the files with only the live rows and maps them again.
+
+    Queries score every row with a single matmul and pick the top k with argpartition.
+    Scores are the same cosine similarities the default JSON store computes, to float32
+    (or float16) precision, so only the order of near-exact ties can differ.
+    """
+
+    stores_text: bool = True
+    persist_dir: Optional[str] = None
+    dtype: str = "float32"
+
+    _vectors = PrivateAttr(default=None)  # persisted rows, memory-mapped
+    _offsets = PrivateAttr(default=None)  # byte offset of each persisted row's node line, plus the end
+    _nodes_fd = PrivateAttr(default=None)
+    _added_vectors = PrivateAttr(default_factory=list)  # rows added since the last persist
+    _added_nodes = PrivateAttr(default_factory=list)
+    _added_matrix = PrivateAttr(default=None)
+    _node_ids = PrivateAttr(default_factory=list)  # per row, persisted rows first
+    _ref_doc_ids = PrivateAttr(default_factory=list)
+    _rows_by_node_id = PrivateAttr(default_factory=dict)  # live rows only
+    _rows_by_ref_doc_id = PrivateAttr(default_factory=dict)
+    _deleted = PrivateAttr(default_factory=set)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @staticmethod
+    def exists(persist_dir: str):
+        """Returns whether `persist_dir` holds a persisted NumPy vector store."""
+        return os.path.exists(os.path.join(persist_dir, VECTORS_FILE))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str):
+        """Opens the store persisted in `persist_dir`, memory-mapping its embeddings."""
+        store = cls(persist_dir=persist_dir)
+        store._load()
+        return store
+
+    def _load(self):
+        with open(os.path.join(self.persist_dir, IDS_FILE), "rb") as ids_file:
+            ids = orjson.loads(ids_file.read())
+
+        vectors = np.load(os.path.join(self.persist_dir, VECTORS_FILE), mmap_mode="r")
+        offsets = np.load(os.path.join(self.persist_dir, OFFSETS_FILE))
+        if not (len(vectors) == len(ids["node_ids"]) == len(ids["ref_doc_ids"]) == len(offsets) - 1):
+            raise ValueError(f"Vector store files in '{self.persist_dir}' do not match; persist it again.")
+
+        if self._nodes_fd is not None:
+            os.close(self._nodes_fd)
+        self._nodes_fd = os.open(os.path.join(self.persist_dir, NODES_FILE), os.O_RDONLY)
+
+        self.dtype = vectors.dtype.name
+        self._vectors = vectors
+        self._offsets = offsets
+        self._added_vectors, self._added_nodes, self._added_matrix = [], [], None
+        self._node_ids = ids["node_ids"]
+        self._ref_doc_ids = ids["ref_doc_ids"]
+        self._deleted = set()
+        self._rows_by_node_id = {node_id: row for row, node_id in enumerate(self._node_ids)}
+        self._rows_by_ref_doc_id = {}
+        for row, ref_doc_id in enumerate(self._ref_doc_ids):
+            self._rows_by_ref_doc_id.setdefault(ref_doc_id, []).append(row)
+
+    @property
+    def _persisted_rows(self):
+        return len(self._vectors) if self._vectors is not None else 0
+
+    def _read_node_line(self, row: int):
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return os.pread(self._nodes_fd, end - start, start)
+
+    def _node(self, row: int):
+        if row >= self._persisted_rows:
+            return self._added_nodes[row - self._persisted_rows]
+        return metadata_dict_to_node(orjson.loads(self._read_node_line(row)))
+
+    def _delete_row(self, row: int):
+        self._deleted.add(row)
+        self._rows_by_node_id.pop(self._node_ids[row], None)
+        rows = self._rows_by_ref_doc_id.get(self._ref_doc_ids[row])
+        if rows is not None:
+            rows.remove(row)
+            if not rows:
+                del self._rows_by_ref_doc_id[self._ref_doc_ids[row]]
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Adds nodes with their embeddings; a node whose ID is already stored replaces it."""
+        for node in nodes:
+            if node.node_id in self._rows_by_node_id:
+                self._delete_row(self._rows_by_node_id[node.node_id])
+
+            row = len(self._node_ids)
+            self._added_vectors.append(_unit(node.get_embedding()))
+            stored = node.model_copy()
+            stored.embedding = None
+            self._added_nodes.append(stored)
+
+            self._node_ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+            self._rows_by_node_id[node.node_id] = row
+            self._rows_by_ref_doc_id.setdefault(node.ref_doc_id, []).append(row)
+
+        self._added_matrix = None
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Deletes every node of the document `ref_doc_id`."""
+        for row in list(self._rows_by_ref_doc_id.get(ref_doc_id, [])):
+            self._delete_row(row)
+
+    def ref_doc_ids(self):
+        """Returns the IDs of the documents that have nodes in the store."""
+        return list(self._rows_by_ref_doc_id)
+
+    def get_nodes(self, node_ids: Optional[List[str]] = None,
+                  filters: Optional[MetadataFilters] = None) -> List[BaseNode]:
+        if filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters.")
+        if node_ids is None:
+            return [self._node(row) for row in sorted(self._rows_by_node_id.values())]
+        return [self._node(self._rows_by_node_id[node_id]) for node_id in node_ids
+                if node_id in self._rows_by_node_id]
+
+    def _scores(self, query_vector):
+        scores = np.empty(len(self._node_ids), dtype=np.float32)
+
+        for start in range(0, self._persisted_rows, SCORE_CHUNK_ROWS):
+            chunk = self._vectors[start:start + SCORE_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32, copy=False) @ query_vector
+
+        if self._added_vectors:
+            if self._added_matrix is None:
+                self._added_matrix = np.stack(self._added_vectors)
+            scores[self._persisted_rows:] = self._added_matrix @ query_vector
+
+        return scores
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Returns the `similarity_top_k` nodes most cosine-similar to the query embedding."""
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"NumpyVectorStore does not support query mode '{query.mode}'.")
+        if query.filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters.")
+        if not self._node_ids:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        scores = self._scores(_unit(query.query_embedding))
+        if self._deleted:
+            scores[list(self._deleted)] = -np.inf
+        # Indexes over text-storing stores pass an empty node ID list, meaning no restriction
+        if query.node_ids or query.doc_ids:
+            allowed = np.zeros(len(scores), dtype=bool)
+            for node_id in query.node_ids or []:
+                if node_id in self._rows_by_node_id:
+                    allowed[self._rows_by_node_id[node_id]] = True
+            for doc_id in query.doc_ids or []:
+                allowed[self._rows_by_ref_doc_id.get(doc_id, [])] = True
+            scores[~allowed] = -np.inf
+
+        k = min(query.similarity_top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[np.isfinite(scores[top])]
+
+        return VectorStoreQueryResult(
+            nodes=[self._node(int(row)) for row in top],
+            similarities=[float(scores[row]) for row in top],
+            ids=[self._node_ids[row] for row in top],
+        )
+
+    def persist(self, persist_path: Optional[str] = None, fs: Any = None) -> None:
+        """
+        Writes the live rows to the store's files and maps them again. Each file is
+        written to a temporary name first and then renamed over the old one.
+
+        Parameters:
+            persist_path (str): Directory to persist to; defaults to the store's `persist_dir`.
+        """
+        persist_dir = persist_path or self.persist_dir
+        os.makedirs(persist_dir, exist_ok=True)
+
+        rows = [row for row in range(len(self._node_ids)) if row not in self._deleted]
+        persisted = self._persisted_rows
+        dim = self._vectors.shape[1] if persisted else (len(self._added_vectors[0]) if self._added_vectors else 0)
+
+        paths = {name: os.path.join(persist_dir, name) for name in (VECTORS_FILE, NODES_FILE, OFFSETS_FILE, IDS_FILE)}
+
+        vectors = np.lib.format.open_memmap(f"{paths[VECTORS_FILE]}.tmp", mode="w+", dtype=self.dtype,
+                                            shape=(len(rows), dim))
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        with open(f"{paths[NODES_FILE]}.tmp", "wb") as nodes_file:
+            for position, row in enumerate(rows):
+                if row < persisted:
+                    vectors[position] = self._vectors[row]
+                    line = self._read_node_line(row)
+                else:
+                    vectors[position] = self._added_vectors[row - persisted]
+                    record = node_to_metadata_dict(self._added_nodes[row - persisted], flat_metadata=False)
+                    # The node JSON already carries its metadata; keep just what restores it
+                    line = orjson.dumps({key: record[key] for key in ("_node_content", "_node_type")}) + b"\n"
+                nodes_file.write(line)
+                offsets[position + 1] = offsets[position] + len(line)
+        vectors.flush()
+        del vectors
+
+        with open(f"{paths[OFFSETS_FILE]}.tmp", "wb") as offsets_file:
+            np.save(offsets_file, offsets)
+        with open(f"{paths[IDS_FILE]}.tmp", "wb") as ids_file:
+            ids_file.write(orjson.dumps({
+                "node_ids": [self._node_ids[row] for row in rows],
+                "ref_doc_ids": [self._ref_doc_ids[row] for row in rows],
+            }))
+
+        for path in paths.values():
+            os.replace(f"{path}.tmp", path)
+
+        self.persist_dir = persist_dir
+        self._load()
+
+
+def migrate_json_index(persist_dir: str, dtype: str = None):
+    """
+    Converts an index persisted with the default JSON stores into a NumPy vector store
+    in the same directory. The JSON files are left in place; once `vectors.npy` exists
+    the index is loaded from it instead.
+
+    Parameters:
+        persist_dir (str): The index's persist directory, e.g. "Manual".
+        dtype (str): "float32" or "float16"; defaults to `config.VECTOR_STORE_DTYPE`.
+
+    Returns:
+        int: Number of nodes migrated.
+    """
+    from llama_index.core import StorageContext
+
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+    embedding_dict = storage_context.vector_store.data.embedding_dict
+
+    nodes = []
+    for node_id, embedding in embedding_dict.items():
+        node = storage_context.docstore.get_node(node_id)
+        node.embedding = embedding
+        nodes.append(node)
+
+    store = NumpyVectorStore(persist_dir=persist_dir, dtype=dtype or config.VECTOR_STORE_DTYPE)
+    store.add(nodes)
+    store.persist()
+
+    print(f"Migrated {len(nodes)} nodes to {os.path.join(persist_dir, VECTORS_FILE)}")
+    return len(nodes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a JSON-persisted index into a NumPy vector store.")
+    parser.add_argument("persist_dir", nargs="?", default="Manual")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=None)
+    args = parser.parse_args()
+    migrate_json_index(args.persist_dir, args.dtype)
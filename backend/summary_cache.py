@@ -0,0 +1,123 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import orjson
+
+import config
+
+
+def make_cache_key(entries, prompt_template: str, model: str):
+    """
+    Builds the content address of a group summary: a SHA-256 over the normalized group
+    JSON, the prompt template and the model name.
+
+    Parameters:
+        entries (list): The group's row dicts.
+        prompt_template (str): Prompt template the summary is generated with.
+        model (str): Name of the LLM generating the summary.
+
+    Returns:
+        str: Hex digest identifying the summary.
+    """
+    digest = hashlib.sha256()
+    digest.update(orjson.dumps(entries, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS))
+    digest.update(b"\0")
+    digest.update(prompt_template.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(model.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """
+    Persistent, size-bounded LRU cache of generated paragraphs backed by SQLite.
+    Safe to share between the summarizer's worker threads.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, paragraph TEXT NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def get(self, key: str):
+        """Returns the cached paragraph for `key` and marks it recently used, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT paragraph FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, paragraph: str):
+        """Stores a paragraph, evicting the least recently used entries beyond `max_entries`."""
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO summaries (key, paragraph, last_used) VALUES (?, ?, ?)",
+                (key, paragraph, time.time_ns()),
+            ).rowcount
+            self._count += inserted
+
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM summaries WHERE key IN "
+                    "(SELECT key FROM summaries ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._count -= overflow
+                self.evictions += overflow
+
+            self._conn.commit()
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters and the current number of entries."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": self._count,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """
+    Returns the process-wide summary cache, or None when caching is disabled
+    (empty `ASKHUB_SUMMARY_CACHE_PATH`).
+    """
+    global _cache
+
+    if not config.SUMMARY_CACHE_PATH:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            cache_dir = os.path.dirname(config.SUMMARY_CACHE_PATH)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            _cache = SummaryCache(config.SUMMARY_CACHE_PATH, config.SUMMARY_CACHE_MAX_ENTRIES)
+        return _cache
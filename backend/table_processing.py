@@ -1,25 +1,278 @@
 import orjson
-import pdfplumber
-from langchain.chains.combine_documents.stuff import StuffDocumentsChain
-from langchain.chains.llm import LLMChain
-from langchain_core.prompts import PromptTemplate
-from langchain_ollama import ChatOllama
-from langchain_community.document_loaders import TextLoader
 import os
 import re
-from PyPDF2 import PdfReader, PdfWriter
+import math
+import time
 import tempfile
-from langchain.schema import Document
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
+import config
+from summary_cache import get_summary_cache, make_cache_key
+from header_classifier import classify_header_candidates
+from jobs import JobCancelled
+from checkpoint import PipelineCheckpoint, SpilledRecords
+from columnar_table import ColumnarTable
+from llm_gateway import MODEL, get_gateway
+from memory_budget import MemoryBudget, MemoryBudgetExceeded
+from metrics import PIPELINE_PAGES, PIPELINE_SECONDS, PIPELINE_STAGE_SECONDS, PREFILTER_SAVED_SECONDS, StageTimings, log_event
+
+# pdfplumber and langchain are imported by the functions that use them, so importing this
+# module (at server startup and in every spawned extraction worker) stays cheap.
 
 #  cd backend source a-venv/bin/activate uvicorn main:app --reload
 
 
-def extract_headers_txt(pdf_path: str):
+def _report(job, **progress):
+    """Reports progress fields to the job running this pipeline, if any."""
+    if job is not None:
+        job.update(**progress)
+
+
+def _report_increment(job, field: str):
+    """Adds one to a progress counter of the job running this pipeline, if any."""
+    if job is not None:
+        job.increment(field)
+
+
+def _check_cancelled(job):
+    """Stops the pipeline with `JobCancelled` if its job has been cancelled."""
+    if job is not None:
+        job.raise_if_cancelled()
+
+
+def _main_table_index(found_tables):
+    """
+    Returns the index of the table pdfplumber's `page.extract_table()` would pick:
+    the largest table by cell count, ties broken by top then left position.
+    """
+    return min(
+        range(len(found_tables)),
+        key=lambda i: (-len(found_tables[i].cells), found_tables[i].bbox[1], found_tables[i].bbox[0]),
+    )
+
+
+# Content stream operators that construct lines, rectangles and curves, as whole tokens
+_PATH_OPERATOR = re.compile(rb"(?:^|[\s()<>\[\]{}/%])(?:re|l|c|v|y)(?=[\s()<>\[\]{}/%]|$)")
+
+
+def page_may_have_tables(page):
+    """
+    Cheap pre-filter run before the table finder, on the page's raw content stream rather
+    than its parsed layout.
+
+    The table finder builds tables from ruling lines only: the edges of drawn lines,
+    rectangles and curves. A page whose content constructs no such path, and which draws
+    no form XObject that could, has no edges, so the finder can't find a table on it.
+    Anything unexpected counts as a possible table, so a real one is never skipped.
+
+    Parameters:
+        page (pdfplumber.page.Page): The page to check.
+
+    Returns:
+        bool: False if the page certainly has no table, True otherwise.
+    """
+    from pdfminer.pdftypes import resolve1
+
+    try:
+        resources = resolve1(page.page_obj.resources) or {}
+        for xobject in (resolve1(resources.get("XObject")) or {}).values():
+            subtype = resolve1(xobject).attrs.get("Subtype")
+            if getattr(subtype, "name", subtype) != "Image":
+                return True
+
+        for content in page.page_obj.contents:
+            stream = resolve1(content)
+            if stream is not None and _PATH_OPERATOR.search(stream.get_data()):
+                return True
+        return False
+    except Exception:
+        return True
+
+
+def extract_page_table_model(page, page_num: int, stats: dict = None):
+    """
+    Runs the pdfplumber table finder once on a page and builds its table model. Pages
+    `page_may_have_tables` rules out get an empty model without running the finder.
+
+    Parameters:
+        page (pdfplumber.page.Page): The page to analyze.
+        page_num (int): 1-based page number.
+        stats (dict): Optional counts from `_extract_stats` to add this page to.
+
+    Returns:
+        dict: The page number, every table on the page, and the header row and
+              body rows of the page's main table (None and [] if it has none).
+    """
+    started = time.perf_counter()
+    if config.PAGE_PREFILTER and not page_may_have_tables(page):
+        if stats is not None:
+            stats["pages_skipped"] += 1
+        return {"page": page_num, "tables": [], "header": None, "rows": []}
+
+    found_tables = page.find_tables()
+    tables = [table.extract() for table in found_tables]
+
+    main_table = tables[_main_table_index(found_tables)] if found_tables else None
+
+    if stats is not None:
+        stats["pages_analyzed"] += 1
+        stats["analyze_seconds"] += time.perf_counter() - started
+
+    return {
+        "page": page_num,
+        "tables": tables,
+        "header": main_table[0] if main_table else None,
+        "rows": main_table[1:] if main_table else [],
+    }
+
+
+def _extract_stats():
+    """Returns empty page pre-filter counts for `extract_page_table_model` to fill in."""
+    return {"pages_analyzed": 0, "pages_skipped": 0, "analyze_seconds": 0.0}
+
+
+def _report_extract_stats(stats: dict, job=None):
+    """Prints, logs and records how many pages the pre-filter skipped and the time that saved."""
+    # Skipped pages would have cost about as much as the pages that were analyzed
+    per_page = stats["analyze_seconds"] / stats["pages_analyzed"] if stats["pages_analyzed"] else 0.0
+    saved = stats["pages_skipped"] * per_page
+
+    PIPELINE_PAGES.inc(stats["pages_analyzed"], result="analyzed")
+    PIPELINE_PAGES.inc(stats["pages_skipped"], result="skipped")
+    PREFILTER_SAVED_SECONDS.inc(saved)
+    _report(job, pages_skipped=stats["pages_skipped"])
+    if not stats["pages_skipped"]:
+        return
+
+    print(f"Skipped table detection on {stats['pages_skipped']} of "
+          f"{stats['pages_analyzed'] + stats['pages_skipped']} pages without ruling lines "
+          f"(about {saved:.2f}s saved)")
+    log_event("page_prefilter", pages_analyzed=stats["pages_analyzed"], pages_skipped=stats["pages_skipped"],
+              analyze_seconds=round(stats["analyze_seconds"], 4), estimated_seconds_saved=round(saved, 4))
+
+
+def extract_page_range(pdf_path: str, start: int, end: int):
     """
-    Extracts headers from tables in each page of a PDF and returns them as a string in JSON format.
+    Opens the PDF and extracts the table model of pages `start` to `end` (1-based, inclusive).
+    Used as the unit of work by the process-pool extraction mode.
 
     Parameters:
         pdf_path (str): Path to the input PDF file.
+        start (int): First page number of the range.
+        end (int): Last page number of the range.
+
+    Returns:
+        tuple: One table model dict per page in the range, in page order, and the range's
+               pre-filter counts.
+    """
+    import pdfplumber
+
+    stats = _extract_stats()
+    page_tables = []
+    with pdfplumber.open(pdf_path, pages=list(range(start, end + 1))) as pdf:
+        for page in pdf.pages:
+            page_tables.append(extract_page_table_model(page, page.page_number, stats))
+            page.close()  # Release the page's cached layout objects now, not when the PDF closes
+    return page_tables, stats
+
+
+def iter_page_tables(pdf_path: str, workers: int = None, job=None, memory: MemoryBudget = None):
+    """
+    Extracts the table model of every page and yields the models one at a time, in page
+    order. Each page's parsed layout is released as soon as its model is built, so memory
+    doesn't grow with the page count.
+
+    With more than one worker, page ranges are sharded across a process pool; each
+    worker opens the PDF itself and the results are merged back in page order, so the
+    output is identical to the sequential path. Only a few shards run ahead of the one
+    being yielded.
+
+    Parameters:
+        pdf_path (str): Path to the input PDF file.
+        workers (int): Number of extraction processes; defaults to `config.EXTRACT_WORKERS`.
+        job (jobs.Job): Optional job to report page progress to and check for cancellation.
+        memory (MemoryBudget): Optional budget checked after every page (sequential) or shard.
+
+    Yields:
+        dict: One table model per page.
+    """
+    import pdfplumber
+
+    workers = workers or config.EXTRACT_WORKERS
+    stats = _extract_stats()
+    extracted = 0
+
+    with pdfplumber.open(pdf_path) as pdf:
+        total_pages = len(pdf.pages)
+        _report(job, pages_total=total_pages)
+
+        if workers <= 1 or total_pages <= 1:
+            for page_num, page in enumerate(pdf.pages, start=1):
+                _check_cancelled(job)
+                page_table = extract_page_table_model(page, page_num, stats)
+                if memory is not None:
+                    memory.check()
+                page.close()  # Release the page's cached layout objects now, not when the PDF closes
+                _report(job, pages_extracted=page_num)
+                yield page_table
+
+            print(f"Extracted tables from {total_pages} pages")
+            _report_extract_stats(stats, job)
+            return
+
+    # Several shards per worker so uneven pages don't leave processes idle
+    shard_size = max(1, math.ceil(total_pages / (workers * 4)))
+    shards = iter([(start, min(start + shard_size - 1, total_pages))
+                   for start in range(1, total_pages + 1, shard_size)])
+
+    # Spawned workers don't inherit the server's threads or open clients
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Finished shards wait in memory until the ones before them are yielded, so keep few in flight
+        pending = deque(pool.submit(extract_page_range, pdf_path, start, end)
+                        for start, end in islice(shards, workers * 2))
+        while pending:
+            shard_tables, shard_stats = pending.popleft().result()
+            next_shard = next(shards, None)
+            if next_shard is not None:
+                pending.append(pool.submit(extract_page_range, pdf_path, *next_shard))
+
+            for field, value in shard_stats.items():
+                stats[field] += value
+            extracted += len(shard_tables)
+            if memory is not None:
+                memory.check()
+            _report(job, pages_extracted=extracted)
+            yield from shard_tables
+
+            if job is not None and job.cancelled:
+                # Drop queued shards; running ones finish within one shard
+                pool.shutdown(wait=False, cancel_futures=True)
+                _check_cancelled(job)
+
+    print(f"Extracted tables from {extracted} pages")
+    _report_extract_stats(stats, job)
+
+
+def extract_page_tables(pdf_path: str, workers: int = None, job=None):
+    """
+    Extracts the table model of every page with `iter_page_tables`. All later stages read
+    from this model instead of re-parsing the PDF.
+
+    Returns:
+        list: One table model dict per page, in page order.
+    """
+    return list(iter_page_tables(pdf_path, workers, job))
+
+
+def extract_headers_txt(page_tables: list):
+    """
+    Extracts headers from the main table of each page and returns them as a string in JSON format.
+
+    Parameters:
+        page_tables (list): Per-page table model from `extract_page_tables`.
 
     Returns:
         str: A string representing the JSON-encoded column names.
@@ -27,19 +280,15 @@ def extract_headers_txt(pdf_path: str):
     # List to store unique headers
     all_column_names = []
 
-    # Open the PDF and process tables
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:  # Remove enumerate to avoid creating tuples
-            table = page.extract_table()
-            
-            # If a table exists, extract the first row as header
-            if table and len(table) > 0:
-                column_names = table[0]  # First row as column headers
-                
-                # Clean and check for duplicates
-                cleaned_column_names = [col.strip() if isinstance(col, str) else col for col in column_names]
-                if cleaned_column_names not in all_column_names:
-                    all_column_names.append(cleaned_column_names)
+    for page_table in page_tables:
+        column_names = page_table["header"]  # First row of the main table
+
+        # If a table exists, use its first row as header
+        if column_names is not None:
+            # Clean and check for duplicates
+            cleaned_column_names = [col.strip() if isinstance(col, str) else col for col in column_names]
+            if cleaned_column_names not in all_column_names:
+                all_column_names.append(cleaned_column_names)
 
     # Serialize the list of column names into a JSON-formatted string
     json_column_names = orjson.dumps(all_column_names, option=orjson.OPT_INDENT_2).decode("utf-8")
@@ -50,6 +299,29 @@ def extract_headers_txt(pdf_path: str):
 
 
 
+# Chains over the LLM gateway's shared chat models, built once per caller and prompt
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+def _stuff_chain(caller: str, prompt_template: str, call_class: str = None, timeout: float = None):
+    """
+    Returns the shared chain that fills `prompt_template`'s "text" with the documents and
+    calls the gateway's chat model for `caller` (see `LLMGateway.chat_model`).
+    """
+    from langchain.chains.combine_documents.stuff import StuffDocumentsChain
+    from langchain.chains.llm import LLMChain
+    from langchain_core.prompts import PromptTemplate
+
+    llm = get_gateway().chat_model(caller, call_class, timeout)
+    with _chains_lock:
+        key = (id(llm), prompt_template)
+        if key not in _chains:
+            llm_chain = LLMChain(llm=llm, prompt=PromptTemplate.from_template(prompt_template))
+            _chains[key] = StuffDocumentsChain(llm_chain=llm_chain, document_variable_name="text")
+        return _chains[key]
+
+
 def process_json_string_for_column_name_extractionLLM_txt(json_string: str):
     """
     Processes a JSON string to extract column names based on a specified prompt and returns the result.
@@ -60,6 +332,8 @@ def process_json_string_for_column_name_extractionLLM_txt(json_string: str):
     Returns:
         str: A string summarizing the extracted column names in the specified format.
     """
+    from langchain.schema import Document
+
     # Prompt template for column extraction
     prompt_template = """
         Carefully analyze the provided JSON data and identify entries that appear to be column names. 
@@ -93,19 +367,7 @@ def process_json_string_for_column_name_extractionLLM_txt(json_string: str):
         ### Final Output:
         Extract and list only column name entries. Do not include any annotations or irrelevant data.
     """
-    prompt = PromptTemplate.from_template(prompt_template)
-
-
-    # Define the LLM
-    llm = ChatOllama(
-        model="llama3",
-        temperature=0,
-        # Add other parameters as required
-    )
-    llm_chain = LLMChain(llm=llm, prompt=prompt)
-
-    # Define StuffDocumentsChain
-    stuff_chain = StuffDocumentsChain(llm_chain=llm_chain, document_variable_name="text")
+    stuff_chain = _stuff_chain("column_names", prompt_template)
 
     # Convert JSON string into a Document object
     input_document = Document(page_content=json_string, metadata={})
@@ -150,38 +412,80 @@ def extract_column_names_from_LLMstring_json(json_string: str):
 
 
 
-def extracted_column_pages_json(pdf_path: str):
+def resolve_column_patterns_json(headers_json: str, page_tables: list):
     """
-    Extracts column names and page numbers from tables in a PDF, cleans them by filtering out
-    empty or whitespace-only columns, and returns the result as a JSON string.
+    Decides which candidate header rows are column names. A local scorer settles the
+    clear cases and only the rows it is unsure about are sent to the LLM.
 
     Parameters:
-        pdf_path (str): Path to the PDF file to process.
+        headers_json (str): JSON string of candidate rows from `extract_headers_txt`.
+        page_tables (list): Per-page table model the candidates were taken from.
 
     Returns:
-        str: A JSON-formatted string containing the cleaned page numbers and column names.
+        str: A JSON-formatted string of the column name rows, in document order.
     """
-    tables_info = []
+    if not config.HEADER_CLASSIFIER:
+        llm_column_names = process_json_string_for_column_name_extractionLLM_txt(headers_json)
+        if not llm_column_names:
+            raise ValueError("Failed to process column names for LLM extraction.")
+        return extract_column_names_from_LLMstring_json(llm_column_names)
+
+    classified = classify_header_candidates(orjson.loads(headers_json), page_tables)
+    for candidate in classified:
+        print(f"Header candidate {candidate['row']}: {candidate['decision']} "
+              f"(score {candidate['score']}, confidence {candidate['confidence']})")
+
+    unsure_rows = [candidate["row"] for candidate in classified if candidate["decision"] == "unsure"]
+    llm_rows = []
+    if unsure_rows:
+        llm_column_names = process_json_string_for_column_name_extractionLLM_txt(
+            orjson.dumps(unsure_rows, option=orjson.OPT_INDENT_2).decode("utf-8")
+        )
+        if not llm_column_names:
+            raise ValueError("Failed to process column names for LLM extraction.")
+        llm_rows = orjson.loads(extract_column_names_from_LLMstring_json(llm_column_names))
 
-    # Open the PDF and process tables
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            tables = page.extract_tables()
+    # Keep document order; LLM rows that don't echo a candidate exactly go last
+    column_names = [
+        candidate["row"] for candidate in classified
+        if candidate["decision"] == "header" or (candidate["decision"] == "unsure" and candidate["row"] in llm_rows)
+    ]
+    column_names.extend(row for row in llm_rows if row not in unsure_rows)
+
+    print(f"Resolved {len(column_names)} column name rows, {len(unsure_rows)} via LLM")
+    return orjson.dumps(column_names, option=orjson.OPT_INDENT_2).decode("utf-8")
+
+
+def extracted_column_pages_json(page_tables: list):
+    """
+    Extracts column names, page numbers and table positions from every table in the page model,
+    cleans them by filtering out empty or whitespace-only columns, and returns the result as a
+    JSON string.
+
+    Parameters:
+        page_tables (list): Per-page table model from `extract_page_tables`.
+
+    Returns:
+        str: A JSON-formatted string containing the cleaned page numbers, table positions and column names.
+    """
+    tables_info = []
 
-            for table in tables:
-                # Extract the first row as column headers if it exists
-                if table:
-                    column_names = table[0]
+    for page_table in page_tables:
+        for position, table in enumerate(page_table["tables"]):
+            # Extract the first row as column headers if it exists
+            if table:
+                column_names = table[0]
 
-                    # Filter out columns that are empty, None, or contain only whitespace
-                    filtered_columns = [col for col in column_names if col and col.strip()]
+                # Filter out columns that are empty, None, or contain only whitespace
+                filtered_columns = [col for col in column_names if col and col.strip()]
 
-                    # Store page and column names only if filtered_columns has valid headers
-                    if filtered_columns:
-                        tables_info.append({
-                            "page": page_num,
-                            "column_names": filtered_columns
-                        })
+                # Store page and column names only if filtered_columns has valid headers
+                if filtered_columns:
+                    tables_info.append({
+                        "page": page_table["page"],
+                        "table": position,
+                        "column_names": filtered_columns
+                    })
 
     # Serialize the cleaned data into a JSON-formatted string
     json_string = orjson.dumps(tables_info, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
@@ -201,113 +505,184 @@ def normalize_text(text):
     return re.sub(r'[^a-zA-Z0-9]', '', text).lower()
 
 
-def is_partial_match(pattern, columns, threshold=0.5):
-    """
-    Checks for a partial match between a pattern and columns based on a threshold.
-    """
-    normalized_pattern = {normalize_text(col) for col in pattern if col}
-    normalized_columns = {normalize_text(col) for col in columns if col}
-    common_elements = normalized_pattern.intersection(normalized_columns)
-    match_ratio = len(common_elements) / len(normalized_pattern)
-    return match_ratio >= threshold
+# Share of a header pattern's normalized columns a table header must contain to match it
+HEADER_MATCH_THRESHOLD = 0.5
 
 
-def find_sequential_page_matches(column_patterns, cleaned_columns):
+def header_signature(columns):
     """
-    Finds the first page that matches each pattern in sequence from column_patterns.
+    Returns the normalized header signature of a header row: the set of its non-empty
+    columns passed through `normalize_text`.
     """
-    page_matches = []
-    pattern_index = 0
+    return frozenset(normalize_text(col) for col in columns if col)
 
-    for page in cleaned_columns:
-        if pattern_index >= len(column_patterns):
-            break
 
-        pattern = column_patterns[pattern_index]
-        if is_partial_match(pattern, page['column_names']):
-            found_page = page['page']
-            page_matches.append(found_page)
-            print(f"Pattern {pattern_index + 1} matched on page {found_page}")
-            pattern_index += 1
+def match_header_patterns(column_patterns, cleaned_columns, threshold: float = HEADER_MATCH_THRESHOLD):
+    """
+    Matches every table header in the document against the column patterns.
 
-    print("\nMatched pages:", page_matches)
-    return page_matches
+    Each distinct header signature is normalized once and indexed by its tokens, with the
+    (page, table index) positions it appears at, so a pattern is only compared with the
+    signatures sharing a token with it. Repeated headers cost one dict lookup, and the
+    matching work depends on the number of distinct headers rather than pages.
 
+    A header matches a pattern when it contains at least `threshold` of the pattern's
+    columns. When several patterns match, the one with the most of its columns present
+    wins, then the one covering most of the header, then the earliest.
 
-def create_page_ranges(page_matches, total_pages):
-    """
-    Generates page ranges from matched pages to be used for PDF splitting.
-    """
-    if len(page_matches) < 2:
-        return [(page_matches[0], total_pages)] if page_matches else []
+    Parameters:
+        column_patterns (list): Column name rows from `resolve_column_patterns_json`.
+        cleaned_columns (list): Table headers from `extracted_column_pages_json`.
+        threshold (float): Share of a pattern's columns a header must contain.
 
-    page_ranges = [(page_matches[i], page_matches[i + 1] - 1) for i in range(len(page_matches) - 1)]
-    page_ranges.append((page_matches[-1], total_pages))
-    print("\nFinal page ranges for splitting:", page_ranges)
-    return page_ranges
+    Returns:
+        dict: (page, table index) -> index of the matched pattern, for matched tables only.
+    """
+    positions = {}  # header signature -> [(page, table index)]
+    for entry in cleaned_columns:
+        positions.setdefault(header_signature(entry["column_names"]), []).append((entry["page"], entry["table"]))
+
+    token_index = {}  # normalized column -> header signatures containing it
+    for signature in positions:
+        for token in signature:
+            token_index.setdefault(token, []).append(signature)
+
+    best = {}  # header signature -> (score, pattern index)
+    seen_patterns = set()
+    for pattern_index, pattern in enumerate(column_patterns):
+        pattern_signature = header_signature(pattern)
+        # Patterns differing only in case or punctuation are the same table
+        if not pattern_signature or pattern_signature in seen_patterns:
+            continue
+        seen_patterns.add(pattern_signature)
+
+        hits = {}
+        for token in pattern_signature:
+            for signature in token_index.get(token, ()):
+                hits[signature] = hits.get(signature, 0) + 1
+
+        for signature, count in hits.items():
+            ratio = count / len(pattern_signature)
+            if ratio < threshold:
+                continue
+            score = (ratio, count / len(signature))
+            if signature not in best or score > best[signature][0]:
+                best[signature] = (score, pattern_index)
+
+    return {
+        position: pattern_index
+        for signature, (_, pattern_index) in best.items()
+        for position in positions[signature]
+    }
+
+
+def _main_table_position(page_table):
+    """Returns the index of the page's main table in its `tables` list, or None if it has none."""
+    if page_table["header"] is None:
+        return None
+    return next(
+        (index for index, table in enumerate(page_table["tables"])
+         if table and table[0] == page_table["header"] and table[1:] == page_table["rows"]),
+        None,
+    )
 
 
-def split_pdf_by_page_ranges(input_pdf_path, output_folder, page_ranges):
+def assign_segments(page_tables: list, matches: dict):
     """
-    Splits the PDF based on the provided page ranges and saves them as separate files.
-    """
-    os.makedirs(output_folder, exist_ok=True)
-    reader = PdfReader(input_pdf_path)
+    Assigns the document's tables to segments in one pass, table by table in page order.
 
-    for idx, (start, end) in enumerate(page_ranges):
-        writer = PdfWriter()
-        print(f"\nSplitting pages from {start} to {end}")
-        for page_number in range(start - 1, end):
-            writer.add_page(reader.pages[page_number])
+    A table matching a pattern starts a new segment unless the current segment belongs to
+    the same pattern (a header repeated on a continuation page). A table that matches
+    nothing continues the current segment if it is the page's main table or has as many
+    columns as the segment's first table; other unmatched tables are ignored, as are tables
+    before the first match. So a page can hold the end of one table and the start of
+    another, and a table layout can recur later in the document.
 
-        output_pdf_path = os.path.join(output_folder, f"pages_{start}_to_{end}.pdf")
-        with open(output_pdf_path, "wb") as output_pdf:
-            writer.write(output_pdf)
-        
-        print(f"Saved: {output_pdf_path}")
+    A segment ends on the page before the next segment starts, or on the page of its own
+    last table if the next one starts on that same page. Segments spanning the same pages
+    are numbered with `part` (1, 2, ...) so their output names stay distinct.
 
+    Parameters:
+        page_tables (list): Per-page table model from `extract_page_tables`.
+        matches (dict): (page, table index) -> pattern index, from `match_header_patterns`.
 
-def split_pdf_to_tables(input_pdf_path: str, col_patterns_json: str, cleaned_columns_json: str):
+    Returns:
+        list: Segments as dicts with their start page, end page, part and [page, table index]
+              of each of their tables, in order.
+    """
+    segments = []
+    current = None
+
+    for page_table in page_tables:
+        page = page_table["page"]
+        main_position = _main_table_position(page_table)
+
+        for position, table in enumerate(page_table["tables"]):
+            pattern_index = matches.get((page, position))
+            if pattern_index is not None and (current is None or pattern_index != current["pattern"]):
+                current = {"pattern": pattern_index, "start": page, "width": len(table[0]), "tables": []}
+                segments.append(current)
+                print(f"Pattern {pattern_index + 1} matched on page {page}")
+
+            if current is None:
+                continue
+            if pattern_index is not None or position == main_position or (table and len(table[0]) == current["width"]):
+                current["tables"].append([page, position])
+
+    total_pages = len(page_tables)
+    parts = {}
+    for number, segment in enumerate(segments):
+        last_page = segment["tables"][-1][0]
+        next_start = segments[number + 1]["start"] if number + 1 < len(segments) else total_pages + 1
+        segment["end"] = max(last_page, next_start - 1)
+
+        parts[segment["start"], segment["end"]] = parts.get((segment["start"], segment["end"]), 0) + 1
+        segment["part"] = parts[segment["start"], segment["end"]]
+
+    return [
+        {"start": segment["start"], "end": segment["end"], "part": segment["part"], "tables": segment["tables"]}
+        for segment in segments
+    ]
+
+
+def split_page_tables(page_tables: list, col_patterns_json: str, cleaned_columns_json: str):
     """
-    Splits a PDF and stores the results as temporary files.
+    Splits the document's tables into segments based on the matched column patterns.
 
     Parameters:
-        input_pdf_path (str): Path to the input PDF file.
+        page_tables (list): Per-page table model from `extract_page_tables`.
         col_patterns_json (str): JSON string containing column patterns.
         cleaned_columns_json (str): JSON string containing cleaned column names.
 
     Returns:
-        list: A list of paths to temporary PDF files.
+        list: Segments from `assign_segments`; `resolve_segments` attaches their tables.
     """
     # Parse JSON strings into Python objects
     column_patterns = orjson.loads(col_patterns_json)
     cleaned_columns = orjson.loads(cleaned_columns_json)
 
-    # Find sequential page matches
-    page_matches = find_sequential_page_matches(column_patterns, cleaned_columns)
-    if not page_matches:
-        print("No page matches found; cannot proceed with PDF splitting.")
+    matches = match_header_patterns(column_patterns, cleaned_columns)
+    segments = assign_segments(page_tables, matches)
+    if not segments:
+        print("No page matches found; cannot proceed with table splitting.")
         return []
 
-    reader = PdfReader(input_pdf_path)
-    total_pages = len(reader.pages)
-    page_ranges = create_page_ranges(page_matches, total_pages)
-
-    # Create a temporary directory to store split PDF files
-    temp_dir = tempfile.TemporaryDirectory()
-    temp_files = []
-
-    for start, end in page_ranges:
-        writer = PdfWriter()
-        for page_number in range(start - 1, end):
-            writer.add_page(reader.pages[page_number])
+    print("\nFinal segments:", [(segment["start"], segment["end"], segment["part"]) for segment in segments])
+    return segments
 
-        temp_file_path = os.path.join(temp_dir.name, f"split_{start}_to_{end}.pdf")
-        with open(temp_file_path, "wb") as temp_file:
-            writer.write(temp_file)
-        temp_files.append(temp_file_path)
 
-    return temp_dir, temp_files
+def resolve_segments(segments: list, page_tables):
+    """
+    Attaches to each segment from `split_page_tables` its tables (lists of rows, header first),
+    one segment at a time as they are consumed.
+    """
+    for segment in segments:
+        yield {
+            "start": segment["start"],
+            "end": segment["end"],
+            "part": segment["part"],
+            "tables": [page_tables[page - 1]["tables"][position] for page, position in segment["tables"]],
+        }
 
 
 # Method to check if two tables are part of a continuous table
@@ -319,6 +694,10 @@ def is_table_continuous(table1, table2):
     if headers_page1 != headers_page2:
         return False
 
+    # A repeated header with no rows under it adds nothing
+    if len(table2) < 2:
+        return True
+
     # Check if the last row of table1 and the first row of table2 share the same key (first column)
     last_row_page1 = table1[-1]
     first_row_page2 = table2[1]
@@ -326,321 +705,654 @@ def is_table_continuous(table1, table2):
     return last_row_page1[0] == first_row_page2[0]
 
 
-# Method to process each PDF file in the input folder and save combined tables in JSON format
-def process_pdfs_to_temp_json_files(pdf_files):
+def _dump_json(dump_dir: str, filename: str, data):
     """
-    Processes PDF files, extracts combined tables, and stores them as JSON files in a temporary directory.
+    Writes intermediate pipeline data to `dump_dir` for debugging. Does nothing when
+    no dump directory is configured.
+    """
+    if not dump_dir:
+        return
 
-    Parameters:
-        pdf_files (list): List of paths to PDF files.
+    os.makedirs(dump_dir, exist_ok=True)
+    with open(os.path.join(dump_dir, filename), 'wb') as dump_file:
+        dump_file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
-    Returns:
-        tuple: A tuple containing the path to the temporary directory and a list of JSON file paths.
+
+def _range_name(item, separator: str):
+    """
+    Returns the page range part of a segment's, table's or group's output names, e.g.
+    "3-5"; a second or later segment over the same pages gets "_part_<n>" appended.
+    """
+    name = f"{item['start']}{separator}{item['end']}"
+    part = item.get("part", 1)
+    return name if part == 1 else f"{name}_part_{part}"
+
+
+# Method to combine the tables of each segment into a columnar table
+def iter_segment_tables(segments, dump_dir: str = None):
     """
-    # Create a temporary directory to store JSON files
-    temp_dir = tempfile.TemporaryDirectory()
-    json_files = []
+    Combines the tables of each segment and yields them one table at a time.
+
+    Parameters:
+        segments (list): Segments from `resolve_segments`.
+        dump_dir (str): Optional directory to also write each table to as JSON.
 
-    for pdf_path in pdf_files:
+    Yields:
+        dict: The segment's start page, end page, part and table (a `ColumnarTable` keyed by header).
+    """
+    for segment in segments:
         combined_table = []
 
-        # Process tables within the PDF
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                table = page.extract_table()
-
-                if table:
-                    # Check if we should combine the table with the previous pages
-                    if combined_table:
-                        if is_table_continuous(combined_table, table):
-                            combined_table.extend(table[1:])  # Skip header row in table2
-                        else:
-                            combined_table.extend(table)
-                    else:
-                        combined_table = table  # Initialize with the first table
-
-        # Convert combined table to JSON and save as a temporary file
+        # Combine the segment's tables in page order
+        for table in segment["tables"]:
+            if not table:
+                continue
+
+            # Check if we should combine the table with the previous pages
+            if combined_table:
+                if is_table_continuous(combined_table, table):
+                    combined_table.extend(table[1:])  # Skip header row in table2
+                else:
+                    combined_table.extend(table)
+            else:
+                combined_table = table  # Initialize with the first table
+
         if combined_table:
-            headers = combined_table[0]  # First row as headers
-            json_data = [dict(zip(headers, row)) for row in combined_table[1:]]  # Skip headers in rows
+            # First row as headers; rows are stored by column instead of as one dict per row
+            table = ColumnarTable.from_rows(combined_table[0], combined_table[1:])
 
-            # Define temporary JSON file path
-            json_file_path = os.path.join(temp_dir.name, f"{os.path.basename(pdf_path).replace('.pdf', '.json')}")
+            if dump_dir:
+                _dump_json(dump_dir, f"split_{_range_name(segment, '_to_')}.json", table.rows())
+            print(f"Combined table for pages {_range_name(segment, '-')}")
 
-            # Save the JSON data to the temporary file
-            with open(json_file_path, 'wb') as json_file:
-                json_file.write(orjson.dumps(json_data, option=orjson.OPT_INDENT_2))
-            
-            json_files.append(json_file_path)
-            print(f"Processed {pdf_path} and saved JSON to {json_file_path}")
+            yield {"start": segment["start"], "end": segment["end"], "part": segment["part"], "table": table}
 
-    return temp_dir, json_files
 
+def encode_table(table):
+    """Returns a table from `iter_segment_tables` as JSON-serializable data, e.g. for a checkpoint."""
+    return {"start": table["start"], "end": table["end"], "part": table["part"], "table": table["table"].to_dict()}
 
-# Fill missing values generically for any table
-def fill_missing_values_generic(data):
-    last_seen_values = {}
 
-    for row in data:
-        for key in row.keys():
-            if row[key] is not None and row[key] != "":
-                # Update the last seen non-null value for this key
-                last_seen_values[key] = row[key]
-            else:
-                # Fill missing value with the last seen non-null value
-                row[key] = last_seen_values.get(key)
+def decode_table(data):
+    """Restores a table encoded with `encode_table`."""
+    return {
+        "start": data["start"],
+        "end": data["end"],
+        "part": data.get("part", 1),
+        "table": ColumnarTable.from_dict(data["table"]),
+    }
+
+
+def iter_filled_tables(tables, dump_dir: str = None):
+    """
+    Fills missing values in each table as it arrives.
+
+    Parameters:
+        tables (iterable): Tables from `iter_segment_tables`.
+        dump_dir (str): Optional directory to also write each filled table to as JSON.
+
+    Yields:
+        dict: The same table with its missing values filled in by `ColumnarTable.fill_forward`.
+    """
+    for table in tables:
+        table["table"].fill_forward()
 
-    return data
+        if dump_dir:
+            _dump_json(dump_dir, f"filled_split_{_range_name(table, '_to_')}.json", table["table"].rows())
 
+        yield table
 
-# Process JSON files in the input folder and save filled data to the output folder
-def processed_json_files(input_jsons):
+
+def iter_logical_groups(tables, dump_dir: str = None):
     """
-    Processes JSON files, fills missing values, and stores the results in a temporary directory.
+    Groups consecutive entries of each table that share the same first key-value pair.
 
     Parameters:
-        input_jsons (list): List of paths to input JSON files.
+        tables (iterable): Filled tables from `iter_filled_tables`.
+        dump_dir (str): Optional directory to also write each group to as a text file.
+
+    Yields:
+        dict: The group's table start page, end page, part, 1-based entry number, name and entries
+              (the group's rows as dicts keyed by header).
+    """
+    for table in tables:
+        # Group boundaries are where the first column's value changes; rows become dicts one group at a time
+        for group_counter, (start, end) in enumerate(table["table"].group_runs(), start=1):
+            yield _make_group(table, group_counter, table["table"].rows(start, end), dump_dir)
+
+
+def _make_group(table, entry_number, entries, dump_dir):
+    name = f"filled_split_{_range_name(table, '_to_')}_group_{entry_number}.txt"
+    _dump_json(dump_dir, name, entries)
+
+    return {
+        "start": table["start"],
+        "end": table["end"],
+        "part": table.get("part", 1),
+        "entry": entry_number,
+        "name": name,
+        "entries": entries,
+    }
+
+
+def _write_summary(group, summary: str, output_folder: str):
+    """Writes a group's paragraph to its deterministic output file and returns the path."""
+    custom_name = f"table_{_range_name(group, '-')}_entry_{group['entry']}.txt"
+    output_file = os.path.join(output_folder, custom_name)
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(summary)
+
+    print(f"Summary saved to '{output_file}'")
+    return output_file
+
+
+def _summarize_group(stuff_chain, group, output_folder: str, retries: int, backoff: float, cache=None,
+                     prompt_template: str = "", model: str = "", job=None, checkpoint=None):
+    """
+    Summarizes one logical group, retrying failed LLM calls with exponential backoff,
+    and writes the paragraph to its deterministic output file. When a summary cache is
+    given, a paragraph previously generated for identical content is reused instead.
 
     Returns:
-        tuple: A tuple containing the path to the temporary directory and a list of paths to filled JSON files.
+        str: Path of the summary file written.
     """
-    # Create a temporary directory for output files
-    temp_output_dir = tempfile.TemporaryDirectory()
-    filled_json_files = []
+    from langchain.schema import Document
+
+    # Serialize the group exactly as it reads in the prompt
+    text = orjson.dumps(group["entries"], option=orjson.OPT_INDENT_2).decode("utf-8")
 
-    for input_file in input_jsons:
-        # Read JSON data
-        with open(input_file, 'rb') as json_file:  # Open in binary mode
-            data = orjson.loads(json_file.read())  # Read and deserialize JSON data
+    cache_key = make_cache_key(group["entries"], prompt_template, model) if cache else None
+    summary = cache.get(cache_key) if cache else None
 
-            # Fill missing values
-            filled_data = fill_missing_values_generic(data)
+    for attempt in range(retries + 1):
+        if summary is not None:
+            break
+
+        # Checked before every LLM call, including retries
+        _check_cancelled(job)
+
+        try:
+            summary = stuff_chain.run([Document(page_content=text, metadata={"source": group["name"]})])
+            # An empty paragraph counts as a failed call: it is retried, never cached or saved
+            if not summary.strip():
+                summary = None
+                raise ValueError(f"The LLM returned an empty paragraph for group {group['name']}.")
+        except Exception as e:
+            if attempt == retries:
+                raise
+
+            delay = backoff * 2 ** attempt
+            print(f"Retrying group '{group['name']}' in {delay:.1f}s after error: {e}")
+            time.sleep(delay)
+        else:
+            if cache:
+                cache.put(cache_key, summary)
 
-            # Define temporary output filename
-            output_filename = f"filled_{os.path.basename(input_file)}"
-            output_filepath = os.path.join(temp_output_dir.name, output_filename)
+    return _finish_group(group, summary, output_folder, checkpoint)
 
-            # Save filled JSON data
-            with open(output_filepath, 'wb') as output_json:  # Open in binary mode for writing
-                output_json.write(orjson.dumps(filled_data, option=orjson.OPT_INDENT_2))  # Serialize with indentation
 
-            filled_json_files.append(output_filepath)
-            print(f"Processed and saved: {output_filepath}")
+def _finish_group(group, summary: str, output_folder: str, checkpoint=None):
+    """Checkpoints a group's paragraph and saves it to the output file."""
+    if checkpoint is not None:
+        checkpoint.record_summary(group["name"], summary)
 
-    return temp_output_dir, filled_json_files
+    # Save the summary to the output file
+    return _write_summary(group, summary, output_folder)
 
 
-def separate_json_logical_entries(input_jsons):
+# Marks the start of each group in a batched prompt and of each paragraph in its output
+BATCH_MARKER = re.compile(r"^[ \t*#]*GROUP[ \t]+(\d+)[ \t*:]*$", re.MULTILINE | re.IGNORECASE)
+
+
+def estimate_tokens(text: str):
+    """Roughly estimates the token count of a prompt text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def split_batch_output(output: str, count: int):
     """
-    Separates entries in each JSON file from the input list, groups consecutive entries
-    with the same first key-value pair, and stores each group as a separate text file
-    in a temporary directory.
+    Splits the output of a batched prompt back into one paragraph per group.
 
     Parameters:
-        input_jsons (list): List of paths to input JSON files.
+        output (str): The LLM output, one "### GROUP <n>" line before each paragraph.
+        count (int): Number of groups in the batch, numbered 1 to `count`.
 
     Returns:
-        tuple: A tuple containing the path to the temporary directory and a list of group file paths.
-    """
-    # Create a temporary directory for storing grouped entries
-    temp_output_dir = tempfile.TemporaryDirectory()
-    group_files = []
-
-    # Loop over each JSON file
-    for input_file in input_jsons:
-        # Read JSON data from the file
-        with open(input_file, 'rb') as json_file:  # Open in binary mode for orjson
-            data = orjson.loads(json_file.read())  # Read and deserialize JSON data
-
-            # Initialize grouping variables
-            current_group = []
-            current_group_key = None
-            group_counter = 0
-
-            # Process each entry
-            for entry in data:
-                if isinstance(entry, dict):
-                    # Get the first key-value pair
-                    first_key, first_value = next(iter(entry.items()))
-                    new_group_key = f"{first_key}={first_value}"
-
-                    # Check if this entry starts a new group
-                    if current_group_key is None:
-                        current_group_key = new_group_key
-
-                    if new_group_key != current_group_key:
-                        # Save the current group to a file
-                        group_filename = f"{os.path.basename(input_file).replace('.json', '')}_group_{group_counter + 1}.txt"
-                        group_filepath = os.path.join(temp_output_dir.name, group_filename)
-                        with open(group_filepath, 'wb') as output_file:
-                            output_file.write(orjson.dumps(current_group, option=orjson.OPT_INDENT_2))
-                        print(f"Created {group_filepath}")
-
-                        # Add file to the list and reset for the next group
-                        group_files.append(group_filepath)
-                        current_group = []
-                        current_group_key = new_group_key
-                        group_counter += 1
-
-                    # Add the entry to the current group
-                    current_group.append(entry)
-
-            # Save the last group if not empty
-            if current_group:
-                group_filename = f"{os.path.basename(input_file).replace('.json', '')}_group_{group_counter + 1}.txt"
-                group_filepath = os.path.join(temp_output_dir.name, group_filename)
-                with open(group_filepath, 'wb') as output_file:
-                    output_file.write(orjson.dumps(current_group, option=orjson.OPT_INDENT_2))
-                print(f"Created {group_filepath}")
-                group_files.append(group_filepath)
-
-    return temp_output_dir, group_files
-
-
-def process_text_files_for_paragraphs(input_folder: tempfile.TemporaryDirectory, output_folder: str):
-    """
-    Processes .txt files in the input folder, summarizes them into a single coherent paragraph,
-    and saves the output to the specified output folder.
+        list: The paragraphs in group order, or None if the output doesn't contain exactly
+              one non-empty paragraph for each group and nothing else.
+    """
+    markers = list(BATCH_MARKER.finditer(output))
+    if not markers or len(markers) != count or output[:markers[0].start()].strip():
+        return None
+
+    paragraphs = {}
+    for marker, next_marker in zip(markers, markers[1:] + [None]):
+        end = next_marker.start() if next_marker else len(output)
+        paragraphs[int(marker.group(1))] = output[marker.end():end].strip()
+
+    if sorted(paragraphs) != list(range(1, count + 1)) or not all(paragraphs.values()):
+        return None
+    return [paragraphs[number] for number in range(1, count + 1)]
+
+
+def _summarize_batch(batch_chain, stuff_chain, batch, output_folder: str, retries: int, backoff: float,
+                     cache=None, prompt_template: str = "", model: str = "", job=None, checkpoint=None):
+    """
+    Summarizes several logical groups with a single LLM call and writes one paragraph per
+    group. Paragraphs are cached under the same key as in `_summarize_group`, so a group
+    summarized alone is a cache hit in a batch and the reverse; groups whose paragraph is
+    cached are left out of the prompt. If the call fails
+    or its output can't be split cleanly into one paragraph per group, every remaining
+    group falls back to its own call through `_summarize_group`.
+
+    Returns:
+        list: For each group in the batch, the path of its summary file or the exception
+              that made it fail.
+    """
+    if len(batch) == 1:
+        try:
+            return [_summarize_group(stuff_chain, batch[0], output_folder, retries, backoff, cache=cache,
+                                     prompt_template=prompt_template, model=model, job=job, checkpoint=checkpoint)]
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return [e]
+
+    from langchain.schema import Document
+
+    results = [None] * len(batch)
+    remaining = []
+    for position, group in enumerate(batch):
+        summary = cache.get(make_cache_key(group["entries"], prompt_template, model)) if cache else None
+        if summary is not None:
+            results[position] = _finish_group(group, summary, output_folder, checkpoint)
+        else:
+            remaining.append(position)
+
+    summaries = None
+    if len(remaining) > 1:
+        _check_cancelled(job)
+
+        # Each group reads as in a single-group prompt, under its marker
+        documents = [
+            Document(
+                page_content=f"### GROUP {number}\n"
+                             + orjson.dumps(batch[position]["entries"], option=orjson.OPT_INDENT_2).decode("utf-8"),
+                metadata={"source": batch[position]["name"]},
+            )
+            for number, position in enumerate(remaining, start=1)
+        ]
+        try:
+            summaries = split_batch_output(batch_chain.run(documents), len(remaining))
+            if summaries is None:
+                print(f"Batch of {len(remaining)} groups could not be split; summarizing them one by one")
+        except Exception as e:
+            print(f"Batch of {len(remaining)} groups failed ({e}); summarizing them one by one")
+
+    if summaries is not None:
+        for position, summary in zip(remaining, summaries):
+            if cache:
+                cache.put(make_cache_key(batch[position]["entries"], prompt_template, model), summary)
+            results[position] = _finish_group(batch[position], summary, output_folder, checkpoint)
+        return results
+
+    for position in remaining:
+        try:
+            results[position] = _summarize_group(
+                stuff_chain, batch[position], output_folder, retries, backoff, cache=cache,
+                prompt_template=prompt_template, model=model, job=job, checkpoint=checkpoint,
+            )
+        except JobCancelled:
+            raise
+        except Exception as e:
+            results[position] = e
+    return results
+
+
+def summarize_groups_to_paragraphs(groups, output_folder: str, concurrency: int = None, timeout: float = None,
+                                   retries: int = None, job=None, checkpoint=None, batch_tokens: int = None):
+    """
+    Summarizes each logical group into a single coherent paragraph and saves it to the
+    output folder. Groups are summarized concurrently as they arrive, with a bounded
+    number of LLM calls in flight. With batching on, consecutive groups are packed into
+    one prompt up to the token budget and the paragraphs are split apart by group.
 
     Parameters:
-        input_folder (TemporaryDirectory): Path to the folder containing input text files.
+        groups (iterable): Logical groups from `iter_logical_groups`.
         output_folder (str): Path to the folder where summarized text files will be saved.
+        concurrency (int): Concurrent LLM calls; defaults to `config.SUMMARY_CONCURRENCY`.
+        timeout (float): Seconds per LLM call; defaults to `config.SUMMARY_TIMEOUT`.
+        retries (int): Retries per group; defaults to `config.SUMMARY_RETRIES`.
+        batch_tokens (int): Estimated prompt tokens of group content per batched call;
+                            defaults to `config.SUMMARY_BATCH_TOKENS`. 0 disables batching.
+        job (jobs.Job): Optional job to report group progress to and check for cancellation.
+        checkpoint (PipelineCheckpoint): Optional checkpoint; groups it already holds a summary
+                                         for are restored instead of summarized again.
+
+    Returns:
+        tuple: A list of the summary files written and a list of the groups that failed,
+               both in group order.
     """
+    concurrency = concurrency or config.SUMMARY_CONCURRENCY
+    timeout = timeout or config.SUMMARY_TIMEOUT
+    retries = config.SUMMARY_RETRIES if retries is None else retries
+    batch_tokens = config.SUMMARY_BATCH_TOKENS if batch_tokens is None else batch_tokens
+
     # Define prompt template
     prompt_template = """write the following information in a single, coherent paragraph while preserving all main points and details preserving the flow. DO NOT SKIP ANY POINT EVEN IF IT'S SERIAL NUMBER. Respond with only the paragraph text itself, and do not include any additional commentary, questions, or suggestions for further assistance. If it is not possible to create a coherent paragraph, then output the data as a single, readable sentence preserving all main points and details preserving flow:
 
     "{text}"
 
     OUTPUT:"""
-    prompt = PromptTemplate.from_template(prompt_template)
 
-    # Define LLM and LLM Chain
-    llm = ChatOllama(
-        model="llama3",
-        temperature=0,
-    )
-    llm_chain = LLMChain(llm=llm, prompt=prompt)
+    # Batched variant: several groups per call, each paragraph under its group's marker
+    batch_prompt_template = """Below are several groups of table rows. Each group starts with a line of the form "### GROUP <number>". For EACH group, write its information in a single, coherent paragraph while preserving all main points and details preserving the flow. DO NOT SKIP ANY POINT EVEN IF IT'S SERIAL NUMBER. Never mix information from different groups. Start every paragraph with the same "### GROUP <number>" line as its group, on a line of its own, in the same order as the groups. Respond with only these lines and paragraphs, and do not include any additional commentary, questions, or suggestions for further assistance. If it is not possible to create a coherent paragraph for a group, then output its data as a single, readable sentence preserving all main points and details preserving flow:
+
+    {text}
+
+    OUTPUT:"""
 
-    # Define StuffDocumentsChain
-    stuff_chain = StuffDocumentsChain(llm_chain=llm_chain, document_variable_name="text")
+    # Separate callers, so latency and token metrics tell single and batched calls apart; the
+    # gateway's timeout bounds each call
+    model = MODEL
+    stuff_chain = _stuff_chain("summarize", prompt_template, timeout=timeout)
+    batch_chain = _stuff_chain("summarize_batch", batch_prompt_template, "summarize", timeout=timeout)
 
     # Ensure output folder exists
     os.makedirs(output_folder, exist_ok=True)
     
-    # Track successful and failed files
-    failed_files = []
-    successful_files = []
-
-    # Use `.name` to access the actual path of the TemporaryDirectory
-    for filename in (f for f in os.listdir(input_folder.name) if f.endswith(".txt")):
-        input_file = os.path.join(input_folder.name, filename)
-
-        # Parse filename to extract table and entry information
-        match = re.match(r".*split_(\d+)_to_(\d+)_group_(\d+)\.txt", filename)
-        if match:
-            table_start, table_end, entry_number = match.groups()
-            custom_name = f"table_{table_start}-{table_end}_entry_{entry_number}.txt"
-        else:
-            custom_name = filename  # Fallback if pattern is not matched
-
-        output_file = os.path.join(output_folder, custom_name)
-        
-        try:
-            # Load the document
-            loader = TextLoader(input_file)
-            docs = loader.load()
+    # Reuse paragraphs already generated for identical group content
+    cache = get_summary_cache()
+    cache_stats = cache.stats() if cache else None
 
-            # Check if the file content is valid
-            if not docs or not docs[0].page_content.strip():
-                raise ValueError(f"File {filename} is empty or has invalid content.")
+    # Track successful and failed groups by their position in the stream
+    successful = {}
+    failed = {}
 
-            # Run the stuff_chain on the loaded document
-            summary = stuff_chain.run(docs)
+    # Groups summarized before an earlier run of this document stopped
+    completed = checkpoint.completed_summaries() if checkpoint is not None else {}
+    if completed:
+        print(f"Resuming summarization: {len(completed)} groups already done")
 
-            # Save the summary to the output file
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(summary)
-            
-            print(f"Summary saved to '{output_file}'")
-            successful_files.append(output_file)
+    def collect(future, members):
+        if future.cancelled():
+            return
 
+        try:
+            results = future.result()
+        except JobCancelled:
+            return
         except Exception as e:
-            print(f"Error processing file '{filename}': {e}")
-            failed_files.append(filename)
+            results = [e] * len(members)
 
-    # Log failed files
+        for (index, name), result in zip(members, results):
+            if isinstance(result, Exception):
+                print(f"Error processing group '{name}': {result}")
+                failed[index] = name
+                _report_increment(job, "groups_failed")
+            else:
+                successful[index] = result
+                _report_increment(job, "groups_summarized")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="summarize") as pool:
+        pending = {}
+        batch, batch_size = [], 0
+        batches, batched_groups = 0, 0
+
+        def submit_batch():
+            nonlocal batch, batch_size, batches, batched_groups
+            future = pool.submit(
+                _summarize_batch, batch_chain, stuff_chain, [group for _, group in batch], output_folder,
+                retries, config.SUMMARY_BACKOFF, cache=cache, prompt_template=prompt_template, model=model,
+                job=job, checkpoint=checkpoint,
+            )
+            pending[future] = [(index, group["name"]) for index, group in batch]
+            batches += 1
+            batched_groups += len(batch)
+            batch, batch_size = [], 0
+
+        for index, group in enumerate(groups):
+            # Keep a bounded backlog so upstream stages aren't drained into memory
+            while len(pending) >= concurrency * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, pending.pop(future))
+
+            if job is not None and job.cancelled:
+                for future in pending:
+                    future.cancel()
+                break
+
+            _report_increment(job, "groups_total")
+
+            if group["name"] in completed:
+                successful[index] = _write_summary(group, completed[group["name"]], output_folder)
+                _report_increment(job, "groups_summarized")
+                continue
+
+            # A group that alone exceeds the budget still gets a call of its own
+            size = estimate_tokens(orjson.dumps(group["entries"], option=orjson.OPT_INDENT_2).decode("utf-8"))
+            if batch and batch_size + size > batch_tokens:
+                submit_batch()
+            batch.append((index, group))
+            batch_size += size
+            if batch_size >= batch_tokens:
+                submit_batch()
+
+        if batch and not (job is not None and job.cancelled):
+            submit_batch()
+
+        for future in wait(pending).done:
+            collect(future, pending[future])
+
+    _check_cancelled(job)
+
+    successful_files = [successful[index] for index in sorted(successful)]
+    failed_files = [failed[index] for index in sorted(failed)]
+
+    if batch_tokens > 0:
+        print(f"Packed {batched_groups} groups into {batches} batched prompts")
+
+    if cache:
+        stats = cache.stats()
+        print(f"Summary cache: {stats['hits'] - cache_stats['hits']} hits, "
+              f"{stats['misses'] - cache_stats['misses']} misses, {stats['entries']} entries")
+
+    # Log failed groups
     if failed_files:
         print(f"\nFailed to process the following files: {failed_files}")
 
-    return len(failed_files) == 0  # Return success status
+    return successful_files, failed_files
 
 
-def process_pdf_to_paragraph(pdf_path):
-    try:
-        # Step 1: Extract column names from the PDF
-        headers = extract_headers_txt(pdf_path)
+def process_pdf_to_paragraph(pdf_path, dump_dir: str = None, job=None, work_dir: str = None, table_sink=None,
+                             output_folder: str = "Tables"):
+    """
+    Runs the full table-to-paragraph pipeline on a PDF.
+
+    Parameters:
+        pdf_path (str): Path to the input PDF file.
+        dump_dir (str): Optional directory for debug dumps of the intermediate tables and
+                        groups; defaults to `config.DEBUG_DUMP_DIR`.
+        job (jobs.Job): Optional job to report progress to. Cancelling it stops the pipeline
+                        between pages and between LLM calls with `JobCancelled`.
+        work_dir (str): Optional per-document work directory. Each stage's output is
+                        checkpointed there, and a rerun with the same directory resumes from
+                        the last completed stage and the last unfinished group. The PDF is
+                        not read again once the page tables are checkpointed.
+        table_sink (callable): Optional function called with every filled table (start page,
+                               end page and `ColumnarTable`), e.g. to store it for direct lookups.
+        output_folder (str): Folder the summary files are written to.
+
+    Pages are released as soon as their tables are extracted, and tables and groups flow
+    through one at a time. With `config.BOUNDED_MEMORY` the page models are spilled to disk
+    too. The process's resident memory is checked after every page, table and group: the
+    job fails with `MemoryBudgetExceeded` above `config.MEMORY_BUDGET_MB`, and the peak is
+    reported to the job and logged with the timings.
+
+    Each stage's own time (excluding the stages it pulls from) is recorded in the
+    `askhub_pipeline_stage_seconds` metric and logged as a `pipeline_timings` event.
+
+    Returns:
+        list: Paths of the summary files written to `output_folder`.
+    """
+    dump_dir = dump_dir or config.DEBUG_DUMP_DIR
+    checkpoint = PipelineCheckpoint(work_dir) if work_dir else None
+    timings = StageTimings(PIPELINE_STAGE_SECONDS)
+    memory = MemoryBudget(config.MEMORY_BUDGET_MB)
+    spill_path = None
+    started = time.perf_counter()
+    outcome = "error"
+
+    def checkpointed(name, compute):
+        return checkpoint.value(name, compute) if checkpoint is not None else compute()
+
+    def checkpointed_stream(name, produce, encode=None, decode=None):
+        return checkpoint.stream(name, produce, encode, decode) if checkpoint is not None else produce()
+
+    def within_budget(items):
+        for item in items:
+            memory.check()
+            yield item
+
+    def extracted_page_tables():
+        nonlocal spill_path
+
+        def produce():
+            return iter_page_tables(pdf_path, job=job, memory=memory)
+
+        if checkpoint is not None:
+            return checkpoint.records("page_tables", produce, spill=config.BOUNDED_MEMORY)
+        if not config.BOUNDED_MEMORY:
+            return list(produce())
+
+        descriptor, spill_path = tempfile.mkstemp(prefix="page_tables_", suffix=".jsonl")
+        os.close(descriptor)
+        return SpilledRecords.write(spill_path, produce())
+
+    def filled_tables():
+        # Step 0: Run table extraction once; every later stage reads this page model
+        _report(job, step="extracting tables")
+        with timings.stage("extract"):
+            page_tables = extracted_page_tables()
+        _report(job, pages_total=len(page_tables), pages_extracted=len(page_tables))
+
+        # Step 1: Extract column names from the page model
+        with timings.stage("headers"):
+            headers = extract_headers_txt(page_tables)
         if not headers:
             raise ValueError("Failed to extract headers from the PDF.")
 
-        # Step 2: Process extracted column names to obtain LLM summaries
-        llm_column_names = process_json_string_for_column_name_extractionLLM_txt(headers)
-        if not llm_column_names:
-            raise ValueError("Failed to process column names for LLM extraction.")
-
-        # Step 3: Convert LLM summaries to JSON format
-        formatted_json = extract_column_names_from_LLMstring_json(llm_column_names)
+        # Steps 2-3: Pick the column name rows; the LLM only sees rows the local scorer is unsure about
+        _check_cancelled(job)
+        _report(job, step="identifying column names")
+        with timings.stage("column_names"):
+            formatted_json = checkpointed("column_patterns",
+                                          lambda: resolve_column_patterns_json(headers, page_tables))
         if not formatted_json:
             raise ValueError("Failed to format column names into JSON.")
 
         # Step 4: Extract page numbers and clean column data
-        column_pages = extracted_column_pages_json(pdf_path)
+        _check_cancelled(job)
+        _report(job, step="segmenting tables")
+        with timings.stage("segment"):
+            column_pages = extracted_column_pages_json(page_tables)
         if not column_pages:
             raise ValueError("Failed to extract and clean column pages from the PDF.")
 
-        # Step 5: Split PDF into smaller PDFs based on column patterns
-        temp_pdf_dir, temp_pdfs = split_pdf_to_tables(pdf_path, formatted_json, column_pages)
-        if not temp_pdfs:
-            raise ValueError("Failed to split PDF into table-specific PDFs.")
-
-        # Step 6: Process the smaller PDFs into temporary JSON files
-        temp_json_dir, temp_jsons = process_pdfs_to_temp_json_files(temp_pdfs)
-        if not temp_jsons:
-            raise ValueError("Failed to process PDFs into JSON files.")
-
-        # Clean up temporary PDF directory after processing
-        temp_pdf_dir.cleanup()
-
-        # Step 7: Fill missing values in JSON files
-        filled_temp_dir, filled_jsons = processed_json_files(temp_jsons)
-        if not filled_jsons:
-            raise ValueError("Failed to fill missing values in JSON files.")
-
-        # Clean up temporary JSON directory after filling missing values
-        temp_json_dir.cleanup()
-
-        # Step 8: Separate JSON entries into individual text files
-        entries_temp_dir, entry_files = separate_json_logical_entries(filled_jsons)
-        if not entry_files:
-            raise ValueError("Failed to separate JSON entries into individual files.")
+        # Step 5: Assign the tables to segments based on column patterns
+        with timings.stage("segment"):
+            segments = checkpointed("segments",
+                                    lambda: split_page_tables(page_tables, formatted_json, column_pages))
+        if not segments:
+            raise ValueError("Failed to split PDF into table segments.")
+        segments = resolve_segments(segments, page_tables)
+
+        # Steps 6-7: Combine segment tables and fill missing values
+        tables = timings.iter("combine", iter_segment_tables(segments, dump_dir))
+        return timings.iter("fill", iter_filled_tables(tables, dump_dir))
+
+    tables_sunk = False
+
+    def sunk_tables():
+        nonlocal tables_sunk
+        # Tee each filled table to the sink on its way to grouping
+        for table in within_budget(checkpointed_stream("filled_tables", filled_tables, encode_table, decode_table)):
+            if table_sink is not None:
+                table_sink(table)
+            yield table
+        tables_sunk = True
+
+    def reported_groups(groups):
+        # The stages before grouping run lazily and report their own steps as groups are
+        # pulled, so report this step again once they are done: at the first group, or at
+        # the end when there are none
+        reported = False
+        for group in groups:
+            if not reported:
+                _report(job, step="summarizing groups")
+                reported = True
+            yield group
+        if not reported:
+            _report(job, step="summarizing groups")
 
-        # Clean up temporary filled JSON directory
-        filled_temp_dir.cleanup()
+    try:
+        # Steps 0-8 are generators, so each group reaches the summarizer as soon as it is ready
+        # and nothing is written to disk unless checkpointing or a debug dump directory is on.
+        # When resuming, stages whose checkpoint is complete aren't run at all.
+        groups = reported_groups(within_budget(timings.iter("group", checkpointed_stream(
+            "groups",
+            lambda: iter_logical_groups(sunk_tables(), dump_dir),
+        ))))
 
         # Step 9: Ensure the "SUMMARIES" folder exists
-        summaries_folder = "Tables"
-        os.makedirs(summaries_folder, exist_ok=True)
-
-        # Generate summaries from separated entries
-        success = process_text_files_for_paragraphs(entries_temp_dir, summaries_folder)
-        if not success:
-            raise ValueError("Failed to generate summaries from text files.")
-
-        # Clean up temporary entries directory
-        entries_temp_dir.cleanup()
-
+        os.makedirs(output_folder, exist_ok=True)
+
+        # Generate summaries from the logical groups
+        _report(job, step="summarizing groups")
+        with timings.stage("summarize"):
+            summary_files, failed_files = summarize_groups_to_paragraphs(
+                groups, output_folder, job=job, checkpoint=checkpoint
+            )
+        if not summary_files and not failed_files:
+            raise ValueError("Failed to separate table entries into logical groups.")
+        if failed_files:
+            raise ValueError("Failed to generate summaries from table groups.")
+
+        # Groups restored from their checkpoint never pulled the filled tables through the sink
+        if table_sink is not None and not tables_sunk:
+            for table in checkpointed_stream("filled_tables", filled_tables, encode_table, decode_table):
+                table_sink(table)
+
+        outcome = "ok"
+        return summary_files
+
+    except JobCancelled:
+        outcome = "cancelled"
+        print("Processing cancelled")
+        raise
     except Exception as e:
         print(f"Error encountered: {e}")
         raise
+    finally:
+        if spill_path is not None:
+            for path in (spill_path, f"{spill_path}.partial"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        total = time.perf_counter() - started
+        PIPELINE_SECONDS.observe(total, outcome=outcome)
+        try:
+            memory.check()
+        except MemoryBudgetExceeded:
+            pass  # Only sampling the peak here; the job's outcome is already decided
+        _report(job, peak_rss_mb=memory.peak_mb)
+        print(f"Peak memory: {memory.peak_mb} MB")
+
+        document = job.filename if job is not None else os.path.basename(pdf_path or "")
+        log_event("pipeline_timings", document=document, outcome=outcome, total_seconds=round(total, 4),
+                  peak_rss_mb=memory.peak_mb, stages=timings.finish())
 
 
 # process_pdf_to_paragraph("documents/1.pdf")
@@ -0,0 +1,278 @@
+import glob
+import os
+import re
+import threading
+
+import orjson
+
+import config
+from table_processing import normalize_text
+
+# Words that never identify a column
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "to", "by", "with", "and", "or", "is", "are", "was",
+    "were", "be", "who", "whom", "whose", "what", "which", "where", "when", "me", "tell", "give", "show",
+    "please", "find", "i", "do", "does", "can", "you", "know", "about", "s",
+}
+
+# Questions that need reasoning over several rows; the router leaves them to RAG
+NON_LOOKUP_PHRASES = ("how many", "why", "explain", "compare", "difference", "summar", "describe", "list all")
+
+# Longest cell value, in words, that can serve as a lookup key
+MAX_KEY_WORDS = 12
+
+# Shortest normalized key; shorter values (serial numbers, initials) match too much
+MIN_KEY_CHARS = 4
+
+# A lookup resolving to more distinct values than this is left to RAG
+MAX_ANSWER_VALUES = 10
+
+
+def _words(text):
+    """Lowercase alphanumeric words of `text`, with a plural "s" dropped so "heads" matches "head"."""
+    words = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _display(value):
+    """Cell or header text with PDF line breaks collapsed into single spaces."""
+    return " ".join(value.split()) if isinstance(value, str) else str(value)
+
+
+class Table:
+    """
+    One filled table stored column by column, with a hash index per column mapping each
+    normalized cell value (`normalize_text`) to the rows holding it.
+    """
+
+    def __init__(self, document_id: str, filename: str, start: int, end: int, columns: list, values: list):
+        self.document_id = document_id
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.columns = columns
+        self.values = values
+
+        self.indexes = []
+        for column_values in values:
+            index = {}
+            for row, value in enumerate(column_values):
+                if isinstance(value, str) and value.strip():
+                    index.setdefault(normalize_text(value), []).append(row)
+            self.indexes.append(index)
+
+        self.column_words = [set(_words(column)) - STOPWORDS if isinstance(column, str) else set()
+                             for column in columns]
+
+    @classmethod
+    def from_columnar(cls, document_id: str, filename: str, start: int, end: int, table):
+        """Builds a table from a filled `ColumnarTable`; cells of columns missing from a row read as None."""
+        columns, values = table.column_values()
+        return cls(document_id, filename, start, end, columns, values)
+
+    def to_dict(self):
+        return {"start": self.start, "end": self.end, "columns": self.columns, "values": self.values}
+
+
+class TableStore:
+    """
+    Persistent store of the filled tables of processed documents, one JSON file per
+    document, held in memory as indexed columnar tables.
+
+    `lookup()` answers questions that name a cell value (the key) and a column, such as
+    "who is the head of the Finance Department", straight from the table.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._tables = {}  # document ID -> tables
+        self._keys = {}  # normalized cell value -> [(table, column)]
+
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            with open(path, "rb") as table_file:
+                document = orjson.loads(table_file.read())
+            self._tables[document["document_id"]] = [
+                Table(document["document_id"], document["filename"], **table) for table in document["tables"]
+            ]
+
+        self._reindex()
+        if self._tables:
+            print(f"Loaded {sum(len(tables) for tables in self._tables.values())} tables "
+                  f"of {len(self._tables)} documents from {directory}")
+
+    def _reindex(self):
+        self._keys = {}
+        for tables in self._tables.values():
+            for table in tables:
+                for column, index in enumerate(table.indexes):
+                    for key in index:
+                        if len(key) >= MIN_KEY_CHARS:
+                            self._keys.setdefault(key, []).append((table, column))
+
+    def add_document(self, document_id: str, filename: str, tables: list, replaces=()):
+        """
+        Stores a document's filled tables, replacing any it had stored before. The tables
+        of the documents in `replaces` are removed, so lookups never answer from a version
+        the upload superseded; other documents, even with the same `filename`, are kept.
+
+        Parameters:
+            document_id (str): Content hash identifying the document.
+            filename (str): Client-supplied name of the document.
+            tables (list): Filled tables from `iter_filled_tables`.
+            replaces (iterable): Content hashes of the documents this one explicitly replaces.
+        """
+        stored = [
+            Table.from_columnar(document_id, filename, table["start"], table["end"], table["table"])
+            for table in tables if len(table["table"])
+        ]
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{document_id}.json")
+        with open(f"{path}.tmp", "wb") as table_file:
+            table_file.write(orjson.dumps({
+                "document_id": document_id,
+                "filename": filename,
+                "tables": [table.to_dict() for table in stored],
+            }))
+        os.replace(f"{path}.tmp", path)
+
+        with self._lock:
+            replaced = [other for other in replaces if other != document_id and self._remove(other)]
+            self._tables[document_id] = stored
+            self._reindex()
+
+        print(f"Stored {len(stored)} tables of '{filename}' for direct lookups"
+              + (f", replacing {len(replaced)} earlier version(s)" if replaced else ""))
+
+    def remove_document(self, document_id: str):
+        """Removes a document's tables from the store. Returns whether it held any."""
+        with self._lock:
+            removed = self._remove(document_id)
+            self._reindex()
+        return removed
+
+    def _remove(self, document_id: str):
+        # Caller holds the lock and reindexes afterwards
+        path = os.path.join(self.directory, f"{document_id}.json")
+        if os.path.exists(path):
+            os.remove(path)
+        return self._tables.pop(document_id, None) is not None
+
+    def _find_keys(self, tokens):
+        """Returns the longest runs of question tokens that equal an indexed cell value, with their spans."""
+        for length in range(min(MAX_KEY_WORDS, len(tokens)), 0, -1):
+            matches = []
+            for start in range(len(tokens) - length + 1):
+                key = normalize_text("".join(tokens[start:start + length]))
+                for table, column in self._keys.get(key, ()):
+                    matches.append((key, table, column, (start, start + length)))
+            if matches:
+                return matches
+        return []
+
+    def lookup(self, question: str):
+        """
+        Answers a key/column lookup from the stored tables.
+
+        The longest run of question words equal to a cell value is the key; the column
+        sharing the most words with the rest of the question is the target. The answer is
+        the target column's values in the key's rows, exactly as in the source table.
+
+        Returns:
+            dict: The answer text, the matched column, key and values and the table they
+                  came from, or None if the question isn't an unambiguous lookup.
+        """
+        lowered = question.lower()
+        if any(phrase in lowered for phrase in NON_LOOKUP_PHRASES):
+            return None
+
+        tokens = re.findall(r"[A-Za-z0-9]+", question)
+
+        with self._lock:
+            candidates = []
+            for key, table, key_column, (start, end) in self._find_keys(tokens):
+                remaining = set(_words(" ".join(tokens[:start] + tokens[end:]))) - STOPWORDS
+
+                scores = sorted(
+                    ((len(words & remaining), len(words & remaining) / len(words), column)
+                     for column, words in enumerate(table.column_words)
+                     if column != key_column and words & remaining),
+                    reverse=True,
+                )
+                # The target column must be a clear winner within its table
+                if not scores or (len(scores) > 1 and scores[0][:2] == scores[1][:2]):
+                    continue
+
+                overlap, ratio, column = scores[0]
+                rows = table.indexes[key_column][key]
+                values = []
+                for row in rows:
+                    value = table.values[column][row]
+                    if value not in (None, "") and _display(value) not in values:
+                        values.append(_display(value))
+
+                if values:
+                    candidates.append(((overlap, ratio), table, key_column, column, rows[0], values))
+
+            if not candidates:
+                self.misses += 1
+                return None
+
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            best = [candidate for candidate in candidates if candidate[0] == candidates[0][0]]
+            # Equally good matches must agree, otherwise the question is ambiguous
+            if any(candidate[5] != best[0][5] for candidate in best) or len(best[0][5]) > MAX_ANSWER_VALUES:
+                self.misses += 1
+                return None
+
+            _, table, key_column, column, row, values = best[0]
+            self.hits += 1
+
+        key_value = _display(table.values[key_column][row])
+        column_name = _display(table.columns[column])
+        return {
+            "answer": f"{column_name} for {key_value}: {'; '.join(values)}",
+            "column": column_name,
+            "key": key_value,
+            "values": values,
+            "document": table.filename,
+            "pages": [table.start, table.end],
+        }
+
+    def stats(self):
+        """Returns the number of stored documents and tables and the router's hit and miss counters."""
+        with self._lock:
+            return {
+                "documents": len(self._tables),
+                "tables": sum(len(tables) for tables in self._tables.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_table_store():
+    """
+    Returns the process-wide table store, or None when direct table lookups are disabled
+    (empty `ASKHUB_TABLE_STORE_DIR`).
+    """
+    global _store
+
+    if not config.TABLE_STORE_DIR:
+        return None
+
+    with _store_lock:
+        if _store is None:
+            _store = TableStore(config.TABLE_STORE_DIR)
+        return _store
@@ -0,0 +1,26 @@
+"""
+Decisions of the local header classifier on rows that have caused wrong column patterns.
+In particular, an all-caps data row seen on a single page must go to the LLM: accepted as a
+header, it becomes a false column pattern that splits its table.
+"""
+import pytest
+
+from header_classifier import classify_header_candidates
+
+# (row, pages whose main table starts with it, expected decision)
+CASES = {
+    "all-caps data row on one page": (["DIRECTOR GENERAL", "ISLAMABAD", "HEAD OFFICE", "KARACHI"], 1, "unsure"),
+    "all-caps header repeated on every page": (["DIRECTOR GENERAL", "ISLAMABAD", "HEAD OFFICE", "KARACHI"], 3,
+                                               "header"),
+    "mixed-case header on one page": (["Sr. No.", "Name of Officer", "Designation", "Contact No."], 1, "unsure"),
+    "uppercase wrapped header repeated on two pages": (["SR.\nNO.", "NAME OF\nOFFICER", "DESIGNATION", "CONTACT\nNO."],
+                                                       2, "header"),
+    "numeric data row": (["1", "051-9201234", "17", "2023-01-05"], 1, "data"),
+    "numeric data row repeated": (["1", "051-9201234", "17", "2023-01-05"], 2, "data"),
+}
+
+
+@pytest.mark.parametrize("row, pages, expected", CASES.values(), ids=CASES.keys())
+def test_classify_header_candidates(row, pages, expected):
+    page_tables = [{"header": row} for _ in range(pages)]
+    assert classify_header_candidates([row], page_tables)[0]["decision"] == expected
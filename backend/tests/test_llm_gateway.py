@@ -0,0 +1,60 @@
+import time
+
+import httpx
+import pytest
+
+from llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailable, PriorityScheduler
+
+TIMEOUT = httpx.Timeout(0.05)
+
+
+class StubOllama(httpx.BaseTransport):
+    """Answers every request with `status` and an unread body, as a live connection does."""
+
+    def __init__(self, status: int):
+        self.status = status
+
+    def handle_request(self, request):
+        return httpx.Response(self.status, stream=httpx.ByteStream(b"{}"))
+
+
+def make_gateway(status: int):
+    scheduler = PriorityScheduler(1, {"interactive": 1, "ingestion": 1})
+    gateway = LLMGateway(scheduler, retries=0, backoff=0.0, breaker=CircuitBreaker(1, 0.05))
+    gateway._pool = StubOllama(status)
+    return gateway
+
+
+def send(gateway):
+    response = gateway.send(httpx.Request("POST", "http://ollama/api/chat"), "query", "interactive", TIMEOUT)
+    response.read()
+    response.close()
+    return response
+
+
+def test_trial_request_without_a_slot_leaves_the_circuit_open():
+    gateway = make_gateway(500)
+
+    send(gateway)
+    assert gateway.breaker.state == "open"
+    time.sleep(0.06)
+
+    # A long-running call holds the only slot, so the trial request never gets sent
+    assert gateway.scheduler.acquire("interactive", 1)
+    with pytest.raises(LLMUnavailable, match="slot"):
+        send(gateway)
+    assert gateway.breaker.state == "open"
+    gateway.scheduler.release("interactive")
+
+    gateway._pool.status = 200
+    assert send(gateway).status_code == 200
+    assert gateway.breaker.state == "closed"
+
+
+def test_open_circuit_rejects_requests_and_frees_the_slot():
+    gateway = make_gateway(500)
+
+    send(gateway)
+    with pytest.raises(LLMUnavailable, match="paused"):
+        send(gateway)
+    assert gateway.scheduler.in_flight == {"interactive": 0, "ingestion": 0}
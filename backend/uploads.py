@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+import time
+from tempfile import NamedTemporaryFile
+
+import orjson
+
+# Bytes read from the upload stream per chunk
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size cap."""
+
+
+async def spool_upload(file, max_bytes: int, suffix: str = ".pdf"):
+    """
+    Streams an upload to a temporary file in chunks, hashing it on the fly, so the
+    whole document is never held in memory.
+
+    Parameters:
+        file (UploadFile): The uploaded file.
+        max_bytes (int): Size cap; larger uploads are discarded with `UploadTooLarge`.
+        suffix (str): Suffix of the temporary file.
+
+    Returns:
+        tuple: The temporary file path, the SHA-256 hex digest and the size in bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    with NamedTemporaryFile(delete=False, suffix=suffix) as spool:
+        try:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit.")
+                digest.update(chunk)
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            os.remove(spool.name)
+            raise
+
+    return spool.name, digest.hexdigest(), size
+
+
+class DocumentRegistry:
+    """
+    Registry of processed documents keyed by content SHA-256, persisted as JSON so an
+    identical re-upload can return its earlier result instead of being reprocessed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._documents = {}
+
+        if os.path.exists(path):
+            with open(path, "rb") as registry_file:
+                self._documents = orjson.loads(registry_file.read())
+
+    def get(self, sha256: str):
+        """
+        Returns the registry entry of a processed document, or None if it is unknown or
+        any of its summary files has since been removed from the document's own output
+        folder. Entries recorded before documents had their own folders count as unknown,
+        since their files may have been overwritten by other documents.
+        """
+        with self._lock:
+            entry = self._documents.get(sha256)
+
+        if entry is None or "output_folder" not in entry:
+            return None
+        output_folder = os.path.abspath(entry["output_folder"])
+        for path in entry["summary_files"]:
+            if os.path.dirname(os.path.abspath(path)) != output_folder or not os.path.exists(path):
+                return None
+        return entry
+
+    def contains(self, sha256: str):
+        """Returns whether a document with this content hash has been processed."""
+        with self._lock:
+            return sha256 in self._documents
+
+    def record(self, sha256: str, filename: str, output_folder: str, summary_files: list, replaces=()):
+        """
+        Registers a successfully processed document, dropping the earlier versions it
+        explicitly replaces, and persists the registry.
+
+        Parameters:
+            sha256 (str): Content hash of the document.
+            filename (str): Client-supplied name of the document.
+            output_folder (str): Folder holding only this document's summary files.
+            summary_files (list): Paths of the summary files, inside `output_folder`.
+            replaces (iterable): Content hashes of the earlier versions to drop.
+
+        Returns:
+            list: The registry entries of the earlier versions dropped.
+        """
+        with self._lock:
+            replaced = [self._documents.pop(other) for other in replaces
+                        if other != sha256 and other in self._documents]
+            self._documents[sha256] = {
+                "sha256": sha256,
+                "filename": filename,
+                "output_folder": output_folder,
+                "summary_files": summary_files,
+                "processed_at": time.time(),
+            }
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # Write then rename so a crash never leaves a truncated registry
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "wb") as registry_file:
+                registry_file.write(orjson.dumps(self._documents, option=orjson.OPT_INDENT_2))
+            os.replace(temp_path, self.path)
+
+        return replaced
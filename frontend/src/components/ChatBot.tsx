@@ -15,6 +15,8 @@ const ChatBot = () => {
     const [inputValue, setInputValue] = useState("");
 
     const abortControllerRef = useRef<AbortController | null>(null);
+    // Secret sent with the upload, so this upload's processing can be cancelled
+    const cancelTokenRef = useRef<string | null>(null);
 
     // Add cleanup effect when component unmounts
     useEffect(() => {
@@ -65,8 +67,10 @@ const ChatBot = () => {
 
             // Create new AbortController for this request
             abortControllerRef.current = new AbortController();
+            cancelTokenRef.current = crypto.randomUUID();
             const formData = new FormData();
             formData.append("file", file);
+            formData.append("cancel_token", cancelTokenRef.current);
 
             try {
                 const response = await fetch("http://127.0.0.1:8000/process-pdf/", {
@@ -95,6 +99,7 @@ const ChatBot = () => {
                 setIsUploading(false);
                 setIsProcessing(false);
                 abortControllerRef.current = null;
+                cancelTokenRef.current = null;
             }
         } else {
             alert("Only PDF files are allowed!");
@@ -102,18 +107,19 @@ const ChatBot = () => {
     };
 
     const handleRemoveFile = async () => {
+        const cancelToken = cancelTokenRef.current;
         if (abortControllerRef.current) {
             // Abort the ongoing fetch request
             abortControllerRef.current.abort();
         }
     
-        if (uploadedFile) {
+        if (uploadedFile && cancelToken) {
             // Send cancellation signal to the backend
             try {
                 await fetch("http://127.0.0.1:8000/cancel-processing/", {
                     method: "POST",
                     headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify({ filename: uploadedFile }),
+                    body: JSON.stringify({ cancel_token: cancelToken }),
                 });
             } catch (err) {
                 console.error("Error sending cancellation request to backend:", err);